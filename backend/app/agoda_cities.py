@@ -0,0 +1,92 @@
+"""
+Cache of Agoda city IDs.
+
+The Agoda spider needs Agoda's ID of the searched city, which it otherwise
+looks up with a suggest request before every crawl. The IDs are kept in the
+agodacity table for AGODA_CITY_ID_TTL_SECONDS.
+
+    python -m app.agoda_cities [CITY ...]
+
+warms the cache for the given cities, or for AGODA_CITIES. Nothing runs it
+at startup, other cities are looked up on their first crawl.
+"""
+
+import argparse
+import logging
+from collections.abc import Sequence
+from datetime import timedelta
+from typing import Any
+
+import httpx
+from sqlmodel import Session
+
+from app import crud
+from app.core.config import settings
+from app.core.db import engine
+from crawler.agoda import SUGGEST_URL, USER_AGENT
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_agoda_city_id(client: httpx.Client, city: str) -> int | None:
+    """
+    Look the city up on Agoda, None if no suggestion has exactly its name.
+    """
+    response = client.get(SUGGEST_URL, params={"searchText": city})
+    response.raise_for_status()
+    suggestions: list[dict[str, Any]] = response.json().get("ViewModelList") or []
+    for item in suggestions:
+        if item.get("Name") == city and item.get("ObjectId"):
+            return int(item["ObjectId"])
+    return None
+
+
+def get_agoda_city_id(*, session: Session, city: str) -> int | None:
+    """
+    Get the Agoda ID of a city from the cache, looking it up on a miss. None
+    if the lookup fails, the spider then looks the city up itself.
+    """
+    max_age = timedelta(seconds=settings.AGODA_CITY_ID_TTL_SECONDS)
+    city_id = crud.get_agoda_city_id(session=session, city=city, max_age=max_age)
+    if city_id is not None:
+        return city_id
+    try:
+        with httpx.Client(headers={"User-Agent": USER_AGENT}, timeout=10) as client:
+            city_id = fetch_agoda_city_id(client, city)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning(f"Could not look up the Agoda ID of {city}: {e}")
+        return None
+    if city_id is not None:
+        crud.save_agoda_city_id(session=session, city=city, agoda_city_id=city_id)
+    return city_id
+
+
+def warm_up(session: Session, cities: Sequence[str]) -> None:
+    with httpx.Client(headers={"User-Agent": USER_AGENT}, timeout=10) as client:
+        for city in cities:
+            try:
+                city_id = fetch_agoda_city_id(client, city)
+            except (httpx.HTTPError, ValueError) as e:
+                logger.error(f"Could not look up {city}: {e}")
+                continue
+            if city_id is None:
+                logger.warning(f"Agoda has no city named {city}")
+                continue
+            crud.save_agoda_city_id(session=session, city=city, agoda_city_id=city_id)
+            logger.info(f"{city}: {city_id}")
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Warm the Agoda city ID cache")
+    parser.add_argument("cities", nargs="*", default=settings.AGODA_CITIES)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Warming the Agoda city ID cache")
+    with Session(engine) as session:
+        warm_up(session, args.cities)
+    logger.info("Agoda city ID cache warmed")
+
+
+if __name__ == "__main__":
+    main()
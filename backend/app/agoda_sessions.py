@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from app.browser import browser_service
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AgodaSessionPool:
+    """
+    Keeps AGODA_SESSION_POOL_SIZE Agoda browser sessions warm, as Playwright
+    storage_state files. A session is warmed by loading the Agoda homepage in
+    the shared browser with the saved cookies, which is what the Agoda spider
+    otherwise does before every search. Spiders given a warm session start
+    their browser context from it and go straight to the search results.
+
+    A background thread warms sessions again before they are
+    AGODA_SESSION_MAX_AGE_SECONDS old or their first cookie expires.
+
+    Use the module level ``agoda_session_pool`` instead of creating new
+    instances.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._directory: Path | None = None
+        # Path of each session file and when it must be warmed again
+        self._sessions: dict[Path, float] = {}
+        self._next = 0
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None and settings.AGODA_SESSION_POOL_SIZE > 0:
+                self._directory = Path(tempfile.mkdtemp(prefix="agoda-sessions-"))
+                self._thread = threading.Thread(
+                    target=self._keep_warm, name="agoda-sessions", daemon=True
+                )
+                self._thread.start()
+
+    def checkout(self) -> str | None:
+        """
+        Return the path of a warm storage_state file, or None if no session
+        is ready yet. Sessions are handed out in turn.
+        """
+        with self._lock:
+            now = time.time()
+            ready = sorted(
+                path for path, refresh_at in self._sessions.items() if refresh_at > now
+            )
+            if not ready:
+                return None
+            self._next += 1
+            return str(ready[self._next % len(ready)])
+
+    def refresh(self) -> None:
+        """
+        Warm every session that is missing or due.
+        """
+        assert self._directory is not None
+        now = time.time()
+        for i in range(settings.AGODA_SESSION_POOL_SIZE):
+            path = self._directory / f"session-{i}.json"
+            if self._sessions.get(path, 0) > now:
+                continue
+            try:
+                state = self._warm()
+            except Exception as e:
+                logger.error(f"Could not warm Agoda session {i}: {e}")
+                continue
+            # Spiders may be reading the previous file, replace it atomically
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(state))
+            os.replace(tmp, path)
+            with self._lock:
+                self._sessions[path] = self._refresh_at(state)
+            logger.info(f"Warmed Agoda session {i}")
+
+    def _refresh_at(self, state: dict[str, Any]) -> float:
+        expires: list[float] = [
+            cookie["expires"]
+            for cookie in state.get("cookies", [])
+            if cookie.get("expires", -1) > 0
+        ]
+        now = time.time()
+        due = min([now + settings.AGODA_SESSION_MAX_AGE_SECONDS, *expires])
+        # Cookies that never last longer than the margin must not keep the
+        # session from ever being handed out
+        return max(
+            due - settings.AGODA_SESSION_REFRESH_MARGIN_SECONDS,
+            now + settings.AGODA_SESSION_CHECK_SECONDS,
+        )
+
+    def _warm(self) -> dict[str, Any]:
+        from playwright.sync_api import sync_playwright
+
+        with open(settings.AGODA_COOKIES_PATH) as f:
+            cookies = json.load(f)
+        cdp_url = browser_service.acquire()
+        try:
+            with sync_playwright() as p:
+                browser = p.chromium.connect_over_cdp(cdp_url)
+                try:
+                    context = browser.new_context(
+                        storage_state={"cookies": cookies, "origins": []}
+                    )
+                    page = context.new_page()
+                    page.goto("https://www.agoda.com/", wait_until="domcontentloaded")
+                    state: dict[str, Any] = dict(context.storage_state())
+                    context.close()
+                    return state
+                finally:
+                    browser.close()
+        finally:
+            browser_service.release()
+
+    def _keep_warm(self) -> None:
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Agoda session pool error: {e}")
+            time.sleep(settings.AGODA_SESSION_CHECK_SECONDS)
+
+
+agoda_session_pool = AgodaSessionPool()
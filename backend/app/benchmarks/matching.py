@@ -0,0 +1,320 @@
+"""
+Benchmark the title matching engines of app.matching.
+
+    python -m app.benchmarks.matching --sizes 100 1000 10000
+    python -m app.benchmarks.matching --replay path/to/crawl
+
+Synthetic runs generate hotel lists with the noise seen between booking.com
+and Agoda titles. Replays read a directory holding the outputs of a real crawl,
+as written by `scrapy crawl booking_spider ... -o booking.jsonl` and
+`scrapy crawl agoda_spider ... -o agoda.jsonl`, and optionally a pairs.jsonl
+of known {"url_booking": ..., "url_agoda": ...} pairs (the hotel table holds
+them) to score precision and recall against.
+
+For every engine and assignment, reports the wall time, the peak memory
+traced by tracemalloc in a second run, and precision and recall.
+"""
+
+import argparse
+import json
+import logging
+import random
+import time
+import tracemalloc
+from collections.abc import Sequence
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from app.matching import ASSIGNMENTS, ENGINES, match_titles
+
+logger = logging.getLogger(__name__)
+
+# Skip the every-pair difflib engine above this many titles per side
+DIFFLIB_MAX_SIZE = 1000
+
+BRANDS = [
+    "Pan Pacific", "Amari", "Radisson Blu", "Le Meridien", "Westin", "Renaissance",
+    "Sheraton", "Holiday Inn", "Best Western", "Sarina", "Lakeshore", "Ascott",
+    "Dusit", "Novotel", "Hyatt", "Crowne Plaza", "Golden Tulip", "Ramada",
+    "Six Seasons", "Platinum", "Grand Sultan", "Royal Tulip", "Sayeman", "Zabeer",
+]  # fmt: skip
+NAMES = [
+    "Sonargaon", "Bay View", "Sea Crown", "Orchid", "Lotus", "Blue Water",
+    "Silver Sand", "Palm Beach", "Hill View", "Rose Garden", "Tropical",
+    "Heritage", "Marina", "Paradise", "Long Beach", "Ocean Paradise", "Nirvana",
+    "Shalimar", "Monarch", "Emerald", "Sapphire", "Crystal", "Jasmine", "Mermaid",
+]  # fmt: skip
+AREAS = [
+    "Dhaka", "Gulshan", "Banani", "Uttara", "Dhanmondi", "Motijheel", "Chittagong",
+    "Agrabad", "Cox's Bazar", "Sylhet", "Sreemangal", "Kuakata", "Rajshahi",
+    "Khulna", "Bashundhara", "Tejgaon", "Baridhara", "Kolatoli", "Inani",
+]  # fmt: skip
+KINDS = [
+    "Hotel", "Resort", "Inn", "Suites", "Residency", "Guest House", "Apartments",
+    "Resort & Spa", "Boutique Hotel", "Hotel & Suites", "Serviced Apartments",
+]  # fmt: skip
+# Spellings of the same place names seen across the two sites
+TRANSLITERATIONS = {
+    "Cox's Bazar": ["Coxs Bazar", "Cox Bazar", "Coxsbazar"],
+    "Chittagong": ["Chattogram", "Chattagram"],
+    "Sonargaon": ["Sonargoan", "Shonargaon"],
+    "Gulshan": ["Gulsan"],
+    "Sylhet": ["Silhet"],
+    "Dhanmondi": ["Dhanmandi"],
+    "Kolatoli": ["Kalatoli", "Kolatali"],
+    "Uttara": ["Uttora"],
+}
+
+
+@dataclass
+class Dataset:
+    name: str
+    booking: list[str]
+    agoda: list[str]
+    booking_stars: list[float | None]
+    agoda_stars: list[float | None]
+    # Index of the true booking.com title of each Agoda title, if known
+    truth: list[int | None] | None
+
+
+@dataclass
+class Result:
+    dataset: str
+    engine: str
+    assignment: str
+    booking: int
+    agoda: int
+    seconds: float
+    peak_mb: float | None
+    matches: int
+    precision: float | None
+    recall: float | None
+
+
+def _hotel_name(rng: random.Random) -> str:
+    parts = [rng.choice(BRANDS + NAMES)]
+    if rng.random() < 0.5:
+        parts.append(rng.choice(NAMES))
+    kind = rng.choice(KINDS)
+    parts = [kind, *parts] if rng.random() < 0.3 else [*parts, kind]
+    if rng.random() < 0.6:
+        parts.append(rng.choice(AREAS))
+    return " ".join(parts)
+
+
+def _agoda_variant(rng: random.Random, name: str, city: str) -> str:
+    """
+    Rewrite a booking.com title the way Agoda tends to list the same hotel.
+    """
+    for spelling, variants in TRANSLITERATIONS.items():
+        if spelling in name and rng.random() < 0.5:
+            name = name.replace(spelling, rng.choice(variants))
+    if name.startswith("Hotel ") and rng.random() < 0.5:
+        name = name.removeprefix("Hotel ")
+    elif rng.random() < 0.2:
+        name = f"Hotel {name}"
+    if rng.random() < 0.2:
+        name = f"{name} & Suites"
+    if city not in name and rng.random() < 0.3:
+        name = f"{name}, {city}" if rng.random() < 0.5 else f"{name} {city}"
+    if rng.random() < 0.2:
+        i = rng.randrange(len(name))
+        name = name[:i] + name[i + 1 :]
+    if rng.random() < 0.1:
+        name = name.upper() if rng.random() < 0.5 else name.lower()
+    return name
+
+
+def synthetic_dataset(size: int, seed: int = 0) -> Dataset:
+    """
+    About size titles per side. Two thirds of the Agoda titles are variants of
+    booking.com titles, the rest are hotels listed on Agoda only, and some
+    booking.com hotels have a sibling property with a similar title.
+    """
+    rng = random.Random(seed)
+    city = rng.choice(AREAS)
+    names: set[str] = set()
+    while len(names) < size:
+        name = _hotel_name(rng)
+        names.add(name)
+        if rng.random() < 0.1 and len(names) < size:
+            names.add(f"{name} {rng.choice(['Annex', '2', 'Express', 'Tower'])}")
+    booking = sorted(names)
+    rng.shuffle(booking)
+    booking_stars: list[float | None] = [
+        rng.choice([None, 2, 3, 3, 4, 4, 5]) for _ in booking
+    ]
+
+    paired = rng.sample(range(size), size * 2 // 3)
+    agoda = [_agoda_variant(rng, booking[i], city) for i in paired]
+    agoda_stars: list[float | None] = [
+        booking_stars[i] if rng.random() < 0.9 else rng.choice([0, 2, 3, 4, 5])
+        for i in paired
+    ]
+    truth: list[int | None] = list(paired)
+    while len(agoda) < size:
+        name = _hotel_name(rng)
+        if name not in names:
+            agoda.append(name)
+            agoda_stars.append(rng.choice([0, 2, 3, 4, 5]))
+            truth.append(None)
+    order = list(range(len(agoda)))
+    rng.shuffle(order)
+    return Dataset(
+        name=f"synthetic-{size}",
+        booking=booking,
+        agoda=[agoda[i] for i in order],
+        booking_stars=booking_stars,
+        agoda_stars=[agoda_stars[i] for i in order],
+        truth=[truth[i] for i in order],
+    )
+
+
+def _read_jsonl(path: Path) -> list[dict]:  # type: ignore[type-arg]
+    with path.open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay_dataset(directory: Path) -> Dataset:
+    booking_items = [
+        i for i in _read_jsonl(directory / "booking.jsonl") if i.get("title")
+    ]
+    agoda_items = [i for i in _read_jsonl(directory / "agoda.jsonl") if i.get("title")]
+    truth: list[int | None] | None = None
+    pairs_path = directory / "pairs.jsonl"
+    if pairs_path.exists():
+        booking_index = {item.get("url"): i for i, item in enumerate(booking_items)}
+        known = {
+            pair["url_agoda"]: booking_index.get(pair["url_booking"])
+            for pair in _read_jsonl(pairs_path)
+        }
+        truth = [known.get(item.get("url")) for item in agoda_items]
+    return Dataset(
+        name=directory.name,
+        booking=[item["title"] for item in booking_items],
+        agoda=[item["title"] for item in agoda_items],
+        booking_stars=[item.get("stars") for item in booking_items],
+        agoda_stars=[item.get("stars") for item in agoda_items],
+        truth=truth,
+    )
+
+
+def _match(dataset: Dataset, engine: str, assignment: str) -> list[int | None]:
+    return match_titles(
+        dataset.agoda,
+        dataset.booking,
+        engine=engine,
+        assignment=assignment,
+        query_stars=dataset.agoda_stars,
+        candidate_stars=dataset.booking_stars,
+    )
+
+
+def run_benchmark(
+    dataset: Dataset, engine: str, assignment: str, measure_memory: bool = True
+) -> Result:
+    start = time.perf_counter()
+    matches = _match(dataset, engine, assignment)
+    seconds = time.perf_counter() - start
+
+    peak_mb = None
+    if measure_memory:
+        # tracemalloc slows allocations down, so it gets a run of its own
+        tracemalloc.start()
+        _match(dataset, engine, assignment)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+    precision = recall = None
+    if dataset.truth is not None:
+        found = sum(match is not None for match in matches)
+        correct = sum(
+            match is not None and match == true
+            for match, true in zip(matches, dataset.truth, strict=True)
+        )
+        expected = sum(true is not None for true in dataset.truth)
+        precision = correct / found if found else 1.0
+        recall = correct / expected if expected else 1.0
+    return Result(
+        dataset=dataset.name,
+        engine=engine,
+        assignment=assignment,
+        booking=len(dataset.booking),
+        agoda=len(dataset.agoda),
+        seconds=seconds,
+        peak_mb=peak_mb,
+        matches=sum(match is not None for match in matches),
+        precision=precision,
+        recall=recall,
+    )
+
+
+def run_benchmarks(
+    datasets: Sequence[Dataset],
+    engines: Sequence[str],
+    assignments: Sequence[str],
+    measure_memory: bool = True,
+) -> list[Result]:
+    results = []
+    for dataset in datasets:
+        for engine in engines:
+            size = max(len(dataset.booking), len(dataset.agoda))
+            if engine == "difflib" and size > DIFFLIB_MAX_SIZE:
+                logger.info(f"Skipping difflib on {dataset.name}, too large")
+                continue
+            for assignment in assignments:
+                result = run_benchmark(dataset, engine, assignment, measure_memory)
+                logger.info(f"{dataset.name} {engine}/{assignment} done")
+                results.append(result)
+    return results
+
+
+def _format(value: float | None, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def print_results(results: Sequence[Result]) -> None:
+    header = (
+        f"{'dataset':<20} {'engine':<8} {'assignment':<10} {'booking':>7} "
+        f"{'agoda':>7} {'seconds':>9} {'peak MB':>8} {'matches':>7} "
+        f"{'precision':>9} {'recall':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r.dataset:<20} {r.engine:<8} {r.assignment:<10} {r.booking:>7} "
+            f"{r.agoda:>7} {r.seconds:>9.3f} {_format(r.peak_mb, '.1f'):>8} "
+            f"{r.matches:>7} {_format(r.precision, '.3f'):>9} "
+            f"{_format(r.recall, '.3f'):>7}"
+        )
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="*", default=[100, 300, 1000, 3000, 10000]
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--replay", type=Path, nargs="*", default=[], help="recorded crawl directory"
+    )
+    parser.add_argument("--engines", nargs="*", default=list(ENGINES))
+    parser.add_argument("--assignments", nargs="*", default=list(ASSIGNMENTS))
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument("--json", type=Path, help="also write the results here")
+    args = parser.parse_args(argv)
+
+    datasets = [synthetic_dataset(size, args.seed) for size in args.sizes]
+    datasets += [replay_dataset(directory) for directory in args.replay]
+    results = run_benchmarks(
+        datasets, args.engines, args.assignments, not args.no_memory
+    )
+    print_results(results)
+    if args.json:
+        args.json.write_text(json.dumps([asdict(r) for r in results], indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,172 @@
+import logging
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port: int = s.getsockname()[1]
+        return port
+
+
+def _chromium_executable() -> str:
+    if settings.BROWSER_EXECUTABLE:
+        return settings.BROWSER_EXECUTABLE
+    # The Chromium build installed by `playwright install chromium`
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as p:
+        return p.chromium.executable_path
+
+
+class BrowserService:
+    """
+    Keeps one headless Chromium running across crawls. The Agoda spider
+    connects to it over CDP (PLAYWRIGHT_CDP_URL) and opens a browser context
+    of its own for each crawl, so a crawl no longer pays for starting a
+    browser.
+
+    A background thread checks that the browser still answers and restarts it
+    when it doesn't. The browser is also restarted after
+    BROWSER_RECYCLE_AFTER_JOBS crawls or BROWSER_RECYCLE_AFTER_SECONDS, once
+    no crawl is using it, to bound its memory growth.
+
+    Use the module level ``browser_service`` instead of creating new
+    instances.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._process: subprocess.Popen[bytes] | None = None
+        self._user_data_dir: str | None = None
+        self._cdp_url: str | None = None
+        self._started_at = 0.0
+        self._jobs = 0
+        self._active = 0
+        self._monitor: threading.Thread | None = None
+
+    def acquire(self) -> str:
+        """
+        Return the CDP URL of a running browser, starting it if needed. Every
+        call must be paired with a call to release() once the crawl is done.
+        """
+        with self._lock:
+            if self._active == 0 and self._recycle_due():
+                logger.info("Recycling the shared browser")
+                self._stop()
+            if not self._running():
+                self._start()
+            self._jobs += 1
+            self._active += 1
+            if self._monitor is None:
+                self._monitor = threading.Thread(
+                    target=self._check_health, name="browser-service", daemon=True
+                )
+                self._monitor.start()
+            assert self._cdp_url is not None
+            return self._cdp_url
+
+    def release(self) -> None:
+        with self._lock:
+            self._active -= 1
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stop()
+
+    def _recycle_due(self) -> bool:
+        return self._process is not None and (
+            self._jobs >= settings.BROWSER_RECYCLE_AFTER_JOBS
+            or time.monotonic() - self._started_at
+            >= settings.BROWSER_RECYCLE_AFTER_SECONDS
+        )
+
+    def _running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _healthy(self) -> bool:
+        if not self._running():
+            return False
+        try:
+            response = httpx.get(f"{self._cdp_url}/json/version", timeout=5)
+        except httpx.HTTPError:
+            return False
+        return response.status_code == 200
+
+    def _start(self) -> None:
+        self._stop()
+        port = _free_port()
+        self._user_data_dir = tempfile.mkdtemp(prefix="browser-service-")
+        self._process = subprocess.Popen(
+            [
+                _chromium_executable(),
+                "--headless=new",
+                "--remote-debugging-address=127.0.0.1",
+                f"--remote-debugging-port={port}",
+                f"--user-data-dir={self._user_data_dir}",
+                "--no-first-run",
+                "--no-default-browser-check",
+                "--disable-dev-shm-usage",
+                "--disable-gpu",
+                "about:blank",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self._cdp_url = f"http://127.0.0.1:{port}"
+        self._started_at = time.monotonic()
+        self._jobs = 0
+
+        deadline = time.monotonic() + settings.BROWSER_START_TIMEOUT_SECONDS
+        while not self._healthy():
+            if not self._running() or time.monotonic() > deadline:
+                self._stop()
+                raise RuntimeError("The shared browser did not start")
+            time.sleep(0.1)
+        logger.info(f"Shared browser started at {self._cdp_url}")
+
+    def _stop(self) -> None:
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.terminate()
+                try:
+                    self._process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    self._process.kill()
+                    self._process.wait()
+            self._process = None
+        if self._user_data_dir is not None:
+            shutil.rmtree(self._user_data_dir, ignore_errors=True)
+            self._user_data_dir = None
+        self._cdp_url = None
+
+    def _check_health(self) -> None:
+        while True:
+            time.sleep(settings.BROWSER_HEALTH_CHECK_SECONDS)
+            with self._lock:
+                if self._process is None:
+                    continue
+                try:
+                    if not self._healthy():
+                        # Crawls using it have lost their browser already
+                        logger.warning("The shared browser stopped responding")
+                        self._start()
+                    elif self._active == 0 and self._recycle_due():
+                        logger.info("Recycling the shared browser")
+                        self._start()
+                except Exception as e:
+                    logger.error(f"Could not restart the shared browser: {e}")
+
+
+browser_service = BrowserService()
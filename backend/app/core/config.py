@@ -4,6 +4,7 @@ from typing import Annotated, Any, Literal
 
 from pydantic import (
     AnyUrl,
+    BaseModel,
     BeforeValidator,
     EmailStr,
     HttpUrl,
@@ -24,6 +25,23 @@ def parse_cors(v: Any) -> list[str] | str:
     raise ValueError(v)
 
 
+class CrawlThrottle(BaseModel):
+    """
+    Limits of crawler.middlewares.AdaptiveThrottleMiddleware for one site.
+    """
+
+    # Seconds between requests, adjusted from the observed latency
+    start_delay: float
+    min_delay: float
+    max_delay: float
+    # Requests in flight, raised while responses come back fine and halved
+    # when the site pushes back
+    start_concurrency: int
+    max_concurrency: int
+    # How many requests should be waiting on the site at any time
+    target_concurrency: float = 1.0
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         # Use top level .env file (one level above ./backend/)
@@ -95,6 +113,95 @@ class Settings(BaseSettings):
     FIRST_SUPERUSER: EmailStr
     FIRST_SUPERUSER_PASSWORD: str
 
+    # Run the booking.com and Agoda spiders at the same time instead of
+    # one after the other
+    CRAWLER_CONCURRENT_SPIDERS: bool = True
+    # "in_process" runs the spiders on a long-lived Scrapy reactor in this
+    # process, "subprocess" forks a `scrapy crawl` per spider and job
+    CRAWLER_BACKEND: Literal["in_process", "subprocess"] = "in_process"
+
+    # Crawl job queue, see app/crawl_worker.py
+    CRAWL_WORKER_POLL_SECONDS: float = 1.0
+    CRAWL_JOB_HEARTBEAT_SECONDS: float = 15.0
+    # A running job whose worker hasn't sent a heartbeat for this long is
+    # considered lost and queued again, up to CRAWL_JOB_MAX_ATTEMPTS times
+    CRAWL_JOB_STALE_SECONDS: float = 120.0
+    CRAWL_JOB_MAX_ATTEMPTS: int = 3
+    # Searches identical to a search completed within this many seconds (on
+    # the same day) reuse its results instead of crawling again, 0 disables
+    CRAWL_CACHE_TTL_SECONDS: int = 60 * 60
+    # Also answer searches from a cached crawl of the same city and stars
+    # over a wider price range, by filtering its items by price
+    CRAWL_CACHE_CONTAINMENT: bool = True
+    # How Agoda titles are matched to booking.com titles, see app/matching.py.
+    # "indexed" gives the same matches as "difflib" without scoring every pair,
+    # "tfidf" scores by cosine similarity of character trigram TF-IDF vectors
+    MATCHING_ENGINE: Literal["difflib", "indexed", "tfidf"] = "indexed"
+    # "optimal" pairs titles one-to-one maximizing the total score, "greedy"
+    # takes the best title for each Agoda title even if another one has it
+    MATCHING_ASSIGNMENT: Literal["greedy", "optimal"] = "optimal"
+    # Score titles in this many processes (0 for one per CPU the worker may
+    # run on, at most 4) when there are at least MATCHING_PARALLEL_MIN_TITLES
+    # Agoda titles to match
+    MATCHING_PROCESSES: int = 0
+    MATCHING_PARALLEL_MIN_TITLES: int = 2000
+    # "api" fetches Agoda search results from its JSON search API with the
+    # saved cookies, falling back to rendering the search page in Chromium
+    # when the API fails; "browser" always renders the page
+    AGODA_SPIDER_MODE: Literal["api", "browser"] = "api"
+    # Keep one headless Chromium running for the Agoda spider to connect to,
+    # instead of launching a browser per crawl, see app/browser.py
+    BROWSER_SERVICE_ENABLED: bool = True
+    # Defaults to the Chromium installed by `playwright install chromium`
+    BROWSER_EXECUTABLE: str | None = None
+    BROWSER_START_TIMEOUT_SECONDS: float = 30.0
+    BROWSER_HEALTH_CHECK_SECONDS: float = 30.0
+    # Restart the browser once it is idle after this many crawls or seconds
+    BROWSER_RECYCLE_AFTER_JOBS: int = 50
+    BROWSER_RECYCLE_AFTER_SECONDS: float = 60 * 60
+    # Agoda city IDs are cached this long, see app/agoda_cities.py, which
+    # can warm the cache for these cities
+    AGODA_CITY_ID_TTL_SECONDS: int = 30 * 24 * 60 * 60
+    AGODA_CITIES: list[str] = [
+        "Dhaka",
+        "Chittagong",
+        "Cox's Bazar",
+        "Sylhet",
+        "Sreemangal",
+        "Khulna",
+        "Rajshahi",
+        "Kuakata",
+    ]
+    # Crawl throttling limits of each site, by domain
+    CRAWL_THROTTLE: dict[str, CrawlThrottle] = {
+        "booking.com": CrawlThrottle(
+            start_delay=0.5,
+            min_delay=0.1,
+            max_delay=10.0,
+            start_concurrency=4,
+            max_concurrency=8,
+            target_concurrency=4.0,
+        ),
+        "agoda.com": CrawlThrottle(
+            start_delay=1.0,
+            min_delay=0.25,
+            max_delay=20.0,
+            start_concurrency=2,
+            max_concurrency=4,
+            target_concurrency=2.0,
+        ),
+    }
+    # Cookies the Agoda spider starts its browser sessions with
+    AGODA_COOKIES_PATH: str = "cookies_agoda.json"
+    # Keep this many Agoda sessions warm in the shared browser so searches
+    # skip the homepage visit (0 to turn off), see app/agoda_sessions.py.
+    # Sessions are warmed again before they are AGODA_SESSION_MAX_AGE_SECONDS
+    # old or their first cookie expires, with a margin.
+    AGODA_SESSION_POOL_SIZE: int = 2
+    AGODA_SESSION_MAX_AGE_SECONDS: float = 30 * 60
+    AGODA_SESSION_REFRESH_MARGIN_SECONDS: float = 5 * 60
+    AGODA_SESSION_CHECK_SECONDS: float = 30.0
+
     def _check_default_secret(self, var_name: str, value: str | None) -> None:
         if value == "changethis":
             message = (
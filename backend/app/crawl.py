@@ -0,0 +1,390 @@
+import json
+import os
+import subprocess
+import uuid
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlmodel import Session, func, select
+
+from app import crud
+from app.agoda_cities import get_agoda_city_id
+from app.agoda_sessions import agoda_session_pool
+from app.browser import browser_service
+from app.core.config import settings
+from app.core.db import engine
+from app.crawl_host import crawl_host
+from app.matching import match_titles, normalize_title
+from app.models import ScrappedItem, ScrappedItemsHistory
+
+
+def _booking_spider_args(
+    history_id: uuid.UUID,
+    city: str,
+    checkin: str,
+    checkout: str,
+    price_min: float,
+    price_max: float,
+    stars: float,
+) -> dict[str, str]:
+    # Format price range and hotel class for booking.com. The items are saved
+    # by crawler.pipelines.HotelComparisonPipeline under history_id.
+    return {
+        "history_id": str(history_id),
+        "location": city,
+        "checkin": checkin,
+        "checkout": checkout,
+        "price_range": f"BDT-{int(price_min)}-{int(price_max)}-1",
+        "hotel_class": str(int(stars)),
+    }
+
+
+def _agoda_spider_args(
+    city: str,
+    checkin: str,
+    checkout: str,
+    price_min: float,
+    price_max: float,
+    stars: float,
+    cdp_url: str | None = None,
+    storage_state: str | None = None,
+    city_id: int | None = None,
+) -> dict[str, str]:
+    args = {
+        "location": city,
+        "checkin": checkin,
+        "checkout": checkout,
+        "adults": str(2),  # Default to 2 adults
+        "rooms": str(1),  # Default to 1 room
+        "hotel_star_rating": str(int(stars)),
+        "price_from": str(int(price_min)),
+        "price_to": str(int(price_max)),
+        "mode": settings.AGODA_SPIDER_MODE,
+        "cookies_path": settings.AGODA_COOKIES_PATH,
+    }
+    if cdp_url:
+        # Use the shared browser instead of launching one
+        args["cdp_url"] = cdp_url
+    if storage_state:
+        # A warm session, the spider skips its homepage visit
+        args["storage_state"] = storage_state
+    if city_id is not None:
+        # Saves the spider its city lookup
+        args["city_id"] = str(city_id)
+    return args
+
+
+def _iter_subprocess_items(
+    process: subprocess.Popen[str], spider_name: str
+) -> Iterator[dict[str, Any]]:
+    assert process.stdout is not None
+    for line in process.stdout:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+    if process.wait() != 0:
+        raise RuntimeError(f"{spider_name} exited with code {process.returncode}")
+
+
+def _start_spider(
+    spider_name: str, spider_args: dict[str, str]
+) -> tuple[Iterator[dict[str, Any]], Callable[[], None]]:
+    """
+    Start a spider on the configured crawler backend and return an iterator
+    over its items as they are scraped, along with a callable that stops the
+    crawl early.
+    """
+    if settings.CRAWLER_BACKEND == "in_process":
+        print(f"Running crawler in process: {spider_name} {spider_args}")
+        return crawl_host.crawl(spider_name, **spider_args)
+
+    cmd = ["scrapy", "crawl", spider_name]
+    for key, value in spider_args.items():
+        cmd += ["-a", f"{key}={value}"]
+    # Feed items to stdout as JSON Lines, the logs keep going to stderr
+    cmd += ["-o", "-:jsonlines"]
+    print(f"Running crawler: {' '.join(cmd)}")
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+
+    def stop() -> None:
+        if process.poll() is None:
+            process.kill()
+
+    return _iter_subprocess_items(process, spider_name), stop
+
+
+def _agoda_price(agoda_item: dict[str, Any]) -> float | None:
+    """
+    The BDT price of an Agoda item, scraped in USD, or None if it has none.
+    """
+    price = agoda_item.get("price")
+    if price is None:
+        return None
+    try:
+        return float(str(price).replace("$", "").replace(",", "").strip()) * 122
+    except ValueError:
+        return None
+
+
+def _available_cpus() -> int:
+    """
+    The CPUs this process may run on, which unlike os.cpu_count() honours
+    the container's cpuset. CPU quotas don't show up there, so stay small.
+    """
+    return min(len(os.sched_getaffinity(0)), 4)
+
+
+def _match_agoda_items(
+    session: Session,
+    city: str,
+    scraped_items: list[ScrappedItem],
+    agoda_items: list[dict[str, Any]],
+) -> list[tuple[ScrappedItem, dict[str, Any]]]:
+    """
+    Pair Agoda items one-to-one with the booking.com items of a crawl. Hotels
+    paired by earlier crawls are looked up in the hotel registry by URL, then
+    items with equal normalized titles are paired, and only the remaining ones
+    are matched by title similarity. New pairs are added to the registry, the
+    caller commits.
+    """
+    # Agoda lists a hotel again when it is both featured and in the results
+    by_url_agoda: dict[str, dict[str, Any]] = {}
+    for item in agoda_items:
+        if item.get("title"):
+            by_url_agoda.setdefault(item.get("url") or item["title"], item)
+    agoda_items = list(by_url_agoda.values())
+    by_url_booking = {item.url_booking: item for item in scraped_items}
+    hotels = crud.get_hotels(
+        session=session,
+        urls_booking=list(by_url_booking),
+        urls_agoda=[item["url"] for item in agoda_items if item.get("url")],
+    )
+    registered_agoda = {hotel.url_agoda: hotel for hotel in hotels if hotel.url_agoda}
+    registered_booking = {hotel.url_booking for hotel in hotels if hotel.url_agoda}
+
+    pairs = []
+    unpaired = []
+    for agoda_item in agoda_items:
+        hotel = registered_agoda.get(agoda_item.get("url", ""))
+        if hotel is None:
+            unpaired.append(agoda_item)
+        elif hotel.url_booking in by_url_booking:
+            pairs.append((by_url_booking[hotel.url_booking], agoda_item))
+    paired_booking = {db_item.url_booking for db_item, _ in pairs}
+
+    new_pairs = []
+    by_title: dict[str, ScrappedItem] = {}
+    for db_item in scraped_items:
+        if db_item.url_booking not in paired_booking:
+            by_title.setdefault(normalize_title(db_item.title), db_item)
+    unmatched = []
+    for agoda_item in unpaired:
+        same_title = by_title.pop(normalize_title(agoda_item["title"]), None)
+        if same_title is None:
+            unmatched.append(agoda_item)
+        else:
+            new_pairs.append((same_title, agoda_item))
+
+    # Booking.com hotels that are paired already, or registered with another
+    # Agoda hotel, are not candidates
+    excluded = registered_booking | paired_booking
+    excluded.update(db_item.url_booking for db_item, _ in new_pairs)
+    candidates = [
+        db_item for db_item in scraped_items if db_item.url_booking not in excluded
+    ]
+    matches = match_titles(
+        [item["title"] for item in unmatched],
+        [db_item.title for db_item in candidates],
+        engine=settings.MATCHING_ENGINE,
+        assignment=settings.MATCHING_ASSIGNMENT,
+        query_stars=[item.get("stars") for item in unmatched],
+        candidate_stars=[db_item.stars for db_item in candidates],
+        processes=settings.MATCHING_PROCESSES or _available_cpus(),
+        parallel_min_queries=settings.MATCHING_PARALLEL_MIN_TITLES,
+    )
+    for agoda_item, match in zip(unmatched, matches, strict=True):
+        if match is not None:
+            new_pairs.append((candidates[match], agoda_item))
+
+    crud.register_hotels(
+        session=session,
+        city=city,
+        pairs=[
+            (db_item.title, db_item.url_booking, agoda_item["url"])
+            for db_item, agoda_item in new_pairs
+            if agoda_item.get("url")
+        ],
+    )
+    return pairs + new_pairs
+
+
+def run_crawler_task(
+    history_id: uuid.UUID,
+    city: str,
+    price_min: float,
+    price_max: float,
+    stars: float,
+) -> str | None:
+    """
+    Background task to run both booking and agoda spiders and save/match results.
+    Returns the error the crawl failed with, which is also saved as the
+    history's status, or None if it completed.
+    """
+
+    session = Session(engine)
+    executor = ThreadPoolExecutor(max_workers=1)
+    agoda_future: Future[list[dict[str, Any]]] | None = None
+    stop_agoda: Callable[[], None] | None = None
+    cdp_url: str | None = None
+    storage_state: str | None = None
+    try:
+        # Calculate checkin/checkout dates
+        tomorrow = datetime.now() + timedelta(days=1)
+        day_after_tomorrow = tomorrow + timedelta(days=1)
+        checkin = tomorrow.strftime("%Y-%m-%d")
+        checkout = day_after_tomorrow.strftime("%Y-%m-%d")
+
+        booking_args = _booking_spider_args(
+            history_id, city, checkin, checkout, price_min, price_max, stars
+        )
+        if settings.BROWSER_SERVICE_ENABLED:
+            try:
+                cdp_url = browser_service.acquire()
+            except Exception as e:
+                print(f"Shared browser unavailable, the spider launches one: {e}")
+        if cdp_url is not None:
+            agoda_session_pool.start()
+            storage_state = agoda_session_pool.checkout()
+        agoda_args = _agoda_spider_args(
+            city,
+            checkin,
+            checkout,
+            price_min,
+            price_max,
+            stars,
+            cdp_url,
+            storage_state,
+            get_agoda_city_id(session=session, city=city),
+        )
+
+        # Step 1: Run the booking_spider, and the agoda_spider alongside it
+        # when concurrent crawling is enabled. Agoda items are only needed for
+        # matching, so they are collected in the background until the end.
+        booking_items, stop_booking = _start_spider("booking_spider", booking_args)
+        if settings.CRAWLER_CONCURRENT_SPIDERS:
+            agoda_items, stop_agoda = _start_spider("agoda_spider", agoda_args)
+            agoda_future = executor.submit(list, agoda_items)
+
+        # Wait for booking.com results. The spider's item pipeline saves
+        # them in batches while crawling, so the first results show up early.
+        try:
+            booking_count = sum(1 for _ in booking_items)
+
+            print(f"Scraped {booking_count} items from booking.com")
+
+            # The pipeline logs the batches it failed to save and carries on
+            saved_count = session.exec(
+                select(func.count())
+                .select_from(ScrappedItem)
+                .where(ScrappedItem.history_id == history_id)
+            ).one()
+            if saved_count < booking_count:
+                raise RuntimeError(
+                    f"Only {saved_count} of {booking_count} items were saved"
+                )
+
+            # Update history status to in-progress
+            scrapped_history = session.get(ScrappedItemsHistory, history_id)
+            scrapped_history.scrape_status = "booking_spider_completed"
+            session.commit()
+            session.refresh(scrapped_history)
+
+        except Exception as e:
+            print(f"Error processing booking.com results: {str(e)}")
+            stop_booking()
+            error = f"booking_failed: {str(e)}"
+            scrapped_history = session.get(ScrappedItemsHistory, history_id)
+            scrapped_history.scrape_status = error
+            session.commit()
+            session.refresh(scrapped_history)
+            return error
+
+        # Step 2: Wait for the agoda_spider, starting it now if it did not
+        # run alongside the booking_spider
+
+        # Update history status
+        scrapped_history = session.get(ScrappedItemsHistory, history_id)
+        scrapped_history.scrape_status = "running_agoda_spider"
+        session.commit()
+
+        if agoda_future is None:
+            agoda_items, stop_agoda = _start_spider("agoda_spider", agoda_args)
+            agoda_future = executor.submit(list, agoda_items)
+
+        try:
+            agoda_results = agoda_future.result()
+
+            print(f"Scraped {len(agoda_results)} items from Agoda")
+
+            # Step 3: Match results from both sources by title similarity
+            # Get all scraped items for this history
+            statement = select(ScrappedItem).where(
+                ScrappedItem.history_id == history_id
+            )
+            scraped_items = session.exec(statement).all()
+
+            # For each Agoda result, find the best match in our database
+            pairs = _match_agoda_items(
+                session, city, list(scraped_items), agoda_results
+            )
+            # Update the matched items with Agoda data in one statement,
+            # leaving out hotels Agoda showed no price for
+            prices = [
+                (best_match.id, price, agoda_item.get("url", ""))
+                for best_match, agoda_item in pairs
+                if (price := _agoda_price(agoda_item)) is not None
+            ]
+            crud.update_agoda_prices(session=session, prices=prices)
+            session.commit()
+            print(f"Matched and updated {len(prices)} items with Agoda data")
+
+            # Update history status to completed
+            scrapped_history = session.get(ScrappedItemsHistory, history_id)
+            scrapped_history.scrape_status = "completed"
+            session.commit()
+            session.refresh(scrapped_history)
+            return None
+
+        except Exception as e:
+            print(f"Error processing Agoda results: {str(e)}")
+            error = f"agoda_failed: {str(e)}"
+            scrapped_history = session.get(ScrappedItemsHistory, history_id)
+            scrapped_history.scrape_status = error
+            session.commit()
+            session.refresh(scrapped_history)
+            return error
+
+    except Exception as e:
+        print(f"Background task error: {str(e)}")
+        error = f"failed: {str(e)}"
+        try:
+            scrapped_history = session.get(ScrappedItemsHistory, history_id)
+            scrapped_history.scrape_status = error
+            session.commit()
+        except Exception as e:
+            scrapped_history = session.get(ScrappedItemsHistory, history_id)
+            print(f"Could not update history status: {str(e)}")
+            scrapped_history.scrape_status = f"failed: {str(e)}"
+            session.commit()
+            session.refresh(scrapped_history)
+        return error
+    finally:
+        # Don't leave a concurrently started agoda_spider running on failure
+        if stop_agoda is not None and agoda_future and not agoda_future.done():
+            stop_agoda()
+        executor.shutdown(wait=True)
+        if cdp_url is not None:
+            browser_service.release()
+        print("Background task completed")
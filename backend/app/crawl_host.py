@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+from collections.abc import Callable, Iterator
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# The spiders live in the Scrapy project next to the app package
+os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "crawler.settings")
+
+# Marks the end of a crawl's item stream
+_CRAWL_FINISHED = object()
+
+
+class CrawlHost:
+    """
+    Keeps Scrapy loaded in the current process and runs spiders on a single
+    asyncio Twisted reactor living in a background thread.
+
+    The reactor can only be started once per process, so use the module level
+    ``crawl_host`` instead of creating new instances.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._reactor: Any = None
+        self._runner: Any = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run_reactor, name="crawl-host", daemon=True
+                )
+                self._thread.start()
+        self._ready.wait()
+
+    def _run_reactor(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        # The reactor has to be installed before anything imports
+        # twisted.internet.reactor, so keep these imports local
+        from twisted.internet import asyncioreactor
+
+        asyncioreactor.install(loop)  # type: ignore[no-untyped-call]
+
+        from scrapy.crawler import CrawlerRunner
+        from scrapy.utils.project import get_project_settings
+        from twisted.internet import reactor
+
+        self._runner = CrawlerRunner(get_project_settings())
+        self._reactor = reactor
+        reactor.callWhenRunning(self._ready.set)  # type: ignore[attr-defined]
+        logger.info("Crawl host reactor started")
+        reactor.run(installSignalHandlers=False)  # type: ignore[attr-defined]
+
+    def crawl(
+        self, spider_name: str, **spider_args: Any
+    ) -> tuple[Iterator[dict[str, Any]], Callable[[], None]]:
+        """
+        Schedule a crawl and return an iterator yielding its items as they are
+        scraped, along with a callable that stops the crawl early.
+
+        The iterator raises the crawl's exception, if any, once it's drained.
+        """
+        self.start()
+        items: queue.Queue[Any] = queue.Queue()
+        crawlers: list[Any] = []
+        self._reactor.callFromThread(
+            self._crawl, items, crawlers, spider_name, spider_args
+        )
+
+        def stop() -> None:
+            def _stop() -> None:
+                for crawler in crawlers:
+                    crawler.stop()
+
+            self._reactor.callFromThread(_stop)
+
+        def iter_items() -> Iterator[dict[str, Any]]:
+            while True:
+                item = items.get()
+                if item is _CRAWL_FINISHED:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+
+        return iter_items(), stop
+
+    def _crawl(
+        self,
+        items: queue.Queue[Any],
+        crawlers: list[Any],
+        spider_name: str,
+        spider_args: dict[str, Any],
+    ) -> None:
+        from scrapy import signals
+
+        def collect_item(item: Any) -> None:
+            items.put(dict(item))
+
+        try:
+            crawler = self._runner.create_crawler(spider_name)
+            crawler.signals.connect(collect_item, signal=signals.item_scraped)
+            crawlers.append(crawler)
+            deferred = self._runner.crawl(crawler, **spider_args)
+        except Exception as e:
+            items.put(e)
+            items.put(_CRAWL_FINISHED)
+            return
+
+        def on_failure(failure: Any) -> None:
+            items.put(failure.value)
+
+        deferred.addErrback(on_failure)
+        deferred.addBoth(lambda _: items.put(_CRAWL_FINISHED))
+
+
+crawl_host = CrawlHost()
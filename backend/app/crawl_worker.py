@@ -0,0 +1,106 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from sqlmodel import Session
+
+from app import crud
+from app.agoda_sessions import agoda_session_pool
+from app.core.config import settings
+from app.core.db import engine
+from app.crawl import run_crawler_task
+
+logger = logging.getLogger(__name__)
+
+
+def _send_heartbeats(
+    job_id: uuid.UUID, worker_id: str, attempt: int, done: threading.Event
+) -> None:
+    while not done.wait(settings.CRAWL_JOB_HEARTBEAT_SECONDS):
+        try:
+            with Session(engine) as session:
+                crud.heartbeat_crawl_job(
+                    session=session,
+                    job_id=job_id,
+                    worker_id=worker_id,
+                    attempts=attempt,
+                )
+        except Exception as e:
+            logger.error(f"Could not send heartbeat for job {job_id}: {e}")
+
+
+def run_next_job(worker_id: str) -> bool:
+    """
+    Claim and run one queued crawl job, returns False if the queue was empty.
+    """
+    with Session(engine) as session:
+        crud.requeue_stale_crawl_jobs(
+            session=session,
+            stale_after=timedelta(seconds=settings.CRAWL_JOB_STALE_SECONDS),
+            max_attempts=settings.CRAWL_JOB_MAX_ATTEMPTS,
+        )
+        job = crud.claim_crawl_job(session=session, worker_id=worker_id)
+        if not job:
+            return False
+        job_id, attempt = job.id, job.attempts
+        history_id, city = job.history_id, job.city
+        price_min, price_max, stars = job.price_min, job.price_max, job.stars
+
+    logger.info(f"Running crawl job {job_id} (attempt {attempt})")
+    done = threading.Event()
+    heartbeat = threading.Thread(
+        target=_send_heartbeats, args=(job_id, worker_id, attempt, done), daemon=True
+    )
+    heartbeat.start()
+    error = None
+    try:
+        # The crawl saves its own failures on the history, the job records
+        # them too so it isn't marked completed
+        error = run_crawler_task(
+            history_id=history_id,
+            city=city,
+            price_min=price_min,
+            price_max=price_max,
+            stars=stars,
+        )
+    except Exception as e:
+        logger.exception(f"Crawl job {job_id} failed")
+        error = str(e)
+    finally:
+        done.set()
+        heartbeat.join()
+
+    with Session(engine) as session:
+        crud.finish_crawl_job(
+            session=session,
+            job_id=job_id,
+            worker_id=worker_id,
+            attempts=attempt,
+            error=error,
+        )
+    logger.info(f"Crawl job {job_id} finished")
+    return True
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    logger.info(f"Starting crawl worker {worker_id}")
+    if settings.BROWSER_SERVICE_ENABLED:
+        # Have sessions warm by the time the first job runs
+        agoda_session_pool.start()
+    while True:
+        try:
+            if run_next_job(worker_id):
+                continue
+        except Exception as e:
+            logger.error(f"Crawl worker error: {e}")
+        time.sleep(settings.CRAWL_WORKER_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,25 @@
 import uuid
+from datetime import datetime, timedelta
 from typing import Any
 
-from sqlmodel import Session, select
+from sqlalchemy import ARRAY, Float, String, Uuid, bindparam, insert, literal, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, col, func, select, update
 
 from app.core.security import get_password_hash, verify_password
-from app.models import Item, ItemCreate, User, UserCreate, UserUpdate
+from app.matching import normalize_title
+from app.models import (
+    AgodaCity,
+    CrawlJob,
+    Hotel,
+    Item,
+    ItemCreate,
+    ScrappedItem,
+    ScrappedItemsHistory,
+    User,
+    UserCreate,
+    UserUpdate,
+)
 
 
 def create_user(*, session: Session, user_create: UserCreate) -> User:
@@ -52,3 +67,487 @@ def create_item(*, session: Session, item_in: ItemCreate, owner_id: uuid.UUID) -
     session.commit()
     session.refresh(db_item)
     return db_item
+
+
+def create_crawl_job(
+    *,
+    session: Session,
+    history_id: uuid.UUID,
+    city: str,
+    price_min: float,
+    price_max: float,
+    stars: float,
+    leader_job_id: uuid.UUID | None = None,
+) -> CrawlJob:
+    """
+    Queue a crawl, or if leader_job_id is given, a job waiting for the results
+    of that identical running crawl.
+    """
+    db_job = CrawlJob(
+        history_id=history_id,
+        city=city,
+        price_min=price_min,
+        price_max=price_max,
+        stars=stars,
+        status="waiting" if leader_job_id else "queued",
+        leader_job_id=leader_job_id,
+    )
+    session.add(db_job)
+    session.commit()
+    session.refresh(db_job)
+    return db_job
+
+
+def claim_crawl_job(*, session: Session, worker_id: str) -> CrawlJob | None:
+    """
+    Claim the oldest queued job. Rows locked by other workers are skipped, so
+    any number of workers can poll the queue at the same time.
+    """
+    statement = (
+        select(CrawlJob)
+        .where(CrawlJob.status == "queued")
+        .order_by(col(CrawlJob.created_at))
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    db_job = session.exec(statement).first()
+    if not db_job:
+        session.rollback()
+        return None
+    now = datetime.now()
+    db_job.status = "running"
+    db_job.attempts += 1
+    db_job.worker_id = worker_id
+    db_job.started_at = now
+    db_job.heartbeat_at = now
+    session.add(db_job)
+    session.commit()
+    session.refresh(db_job)
+    return db_job
+
+
+def heartbeat_crawl_job(
+    *, session: Session, job_id: uuid.UUID, worker_id: str, attempts: int
+) -> None:
+    """
+    Refresh the heartbeat of a job, as long as this run of it still owns it.
+    """
+    statement = (
+        update(CrawlJob)
+        .where(
+            col(CrawlJob.id) == job_id,
+            col(CrawlJob.status) == "running",
+            col(CrawlJob.worker_id) == worker_id,
+            col(CrawlJob.attempts) == attempts,
+        )
+        .values(heartbeat_at=datetime.now())
+    )
+    session.execute(statement)
+    session.commit()
+
+
+def _crawl_params_key(
+    city: str, price_min: float, price_max: float, stars: float
+) -> str:
+    # The API passes its integer defaults, jobs read floats back from the
+    # database, both have to lock the same key
+    return f"{city}|{float(price_min):g}|{float(price_max):g}|{float(stars):g}"
+
+
+def lock_crawl_params(
+    *, session: Session, city: str, price_min: float, price_max: float, stars: float
+) -> None:
+    """
+    Serialize everything touching crawls of these search parameters, across
+    all API and crawl workers, until the current transaction ends.
+    """
+    key = _crawl_params_key(city, price_min, price_max, stars)
+    session.execute(select(func.pg_advisory_xact_lock(func.hashtext(key))))
+
+
+def get_active_crawl_job(
+    *, session: Session, city: str, price_min: float, price_max: float, stars: float
+) -> CrawlJob | None:
+    """
+    Get a queued or running crawl of these parameters from today, that later
+    identical searches can wait for. Hold lock_crawl_params while using it.
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    statement = (
+        select(CrawlJob)
+        .where(
+            col(CrawlJob.status).in_(["queued", "running"]),
+            CrawlJob.city == city,
+            CrawlJob.price_min == price_min,
+            CrawlJob.price_max == price_max,
+            CrawlJob.stars == stars,
+            col(CrawlJob.created_at) >= today,
+        )
+        .order_by(col(CrawlJob.created_at))
+        .limit(1)
+    )
+    return session.exec(statement).first()
+
+
+def _release_waiting_crawl_jobs(*, session: Session, db_job: CrawlJob) -> None:
+    """
+    Hand the results of a finished crawl to the jobs waiting for it. If it
+    didn't complete, the oldest waiting job is queued to crawl in its place and
+    the others wait for that one instead.
+
+    Waiting jobs locked by another transaction are skipped, whoever holds them
+    releases them.
+    """
+    history = session.get(ScrappedItemsHistory, db_job.history_id)
+    completed = (
+        db_job.status == "completed"
+        and history is not None
+        and history.scrape_status == "completed"
+    )
+    statement = (
+        select(CrawlJob)
+        .where(CrawlJob.leader_job_id == db_job.id, CrawlJob.status == "waiting")
+        .order_by(col(CrawlJob.created_at))
+        .with_for_update(skip_locked=True)
+        .execution_options(populate_existing=True)
+    )
+    new_leader: CrawlJob | None = None
+    for waiting_job in session.exec(statement).all():
+        waiting_history = session.get(ScrappedItemsHistory, waiting_job.history_id)
+        if completed and waiting_history:
+            copy_scrapped_items(
+                session=session,
+                source_history_id=db_job.history_id,
+                history_id=waiting_job.history_id,
+            )
+            waiting_history.scrape_status = "completed"
+            session.add(waiting_history)
+            waiting_job.status = "completed"
+            waiting_job.finished_at = datetime.now()
+        elif new_leader is None:
+            waiting_job.status = "queued"
+            waiting_job.leader_job_id = None
+            new_leader = waiting_job
+        else:
+            waiting_job.leader_job_id = new_leader.id
+        session.add(waiting_job)
+
+
+def finish_crawl_job(
+    *,
+    session: Session,
+    job_id: uuid.UUID,
+    worker_id: str,
+    attempts: int,
+    error: str | None = None,
+) -> None:
+    """
+    Record the outcome of a run and release the jobs waiting for it. Does
+    nothing if the run no longer owns the job, because it was requeued and
+    claimed again, or failed, after its heartbeats stopped.
+    """
+    statement = (
+        select(CrawlJob)
+        .where(
+            CrawlJob.id == job_id,
+            CrawlJob.status == "running",
+            CrawlJob.worker_id == worker_id,
+            CrawlJob.attempts == attempts,
+        )
+        .with_for_update()
+    )
+    db_job = session.exec(statement).first()
+    if not db_job:
+        session.rollback()
+        return
+    lock_crawl_params(
+        session=session,
+        city=db_job.city,
+        price_min=db_job.price_min,
+        price_max=db_job.price_max,
+        stars=db_job.stars,
+    )
+    db_job.status = "failed" if error else "completed"
+    db_job.error = error
+    db_job.finished_at = datetime.now()
+    session.add(db_job)
+    _release_waiting_crawl_jobs(session=session, db_job=db_job)
+    session.commit()
+
+
+def requeue_stale_crawl_jobs(
+    *, session: Session, stale_after: timedelta, max_attempts: int
+) -> int:
+    """
+    Put running jobs whose worker stopped sending heartbeats back in the queue,
+    or fail them (and their history) once they ran out of attempts. Jobs
+    waiting for a crawl that no longer exists are queued as well, and those
+    waiting for a crawl that finished without releasing them are released.
+    """
+    statement = (
+        select(CrawlJob)
+        .where(
+            CrawlJob.status == "running",
+            col(CrawlJob.heartbeat_at) < datetime.now() - stale_after,
+        )
+        .with_for_update(skip_locked=True)
+    )
+    stale_jobs = session.exec(statement).all()
+    for db_job in stale_jobs:
+        if db_job.attempts < max_attempts:
+            db_job.status = "queued"
+            db_job.worker_id = None
+        else:
+            db_job.status = "failed"
+            db_job.error = "crawl worker lost"
+            db_job.finished_at = datetime.now()
+            history = session.get(ScrappedItemsHistory, db_job.history_id)
+            if history:
+                history.scrape_status = "failed: crawl worker lost"
+                session.add(history)
+            _release_waiting_crawl_jobs(session=session, db_job=db_job)
+        session.add(db_job)
+    session.commit()
+    # Leaders that finished without releasing their waiting jobs. Each one is
+    # released under its parameters' lock, in a transaction of its own, so no
+    # other worker can hand the same results over at the same time.
+    finished_leaders = select(CrawlJob).where(
+        col(CrawlJob.status).not_in(["queued", "running"]),
+        col(CrawlJob.id).in_(
+            select(CrawlJob.leader_job_id).where(CrawlJob.status == "waiting")
+        ),
+    )
+    for leader in session.exec(finished_leaders).all():
+        lock_crawl_params(
+            session=session,
+            city=leader.city,
+            price_min=leader.price_min,
+            price_max=leader.price_max,
+            stars=leader.stars,
+        )
+        _release_waiting_crawl_jobs(session=session, db_job=leader)
+        session.commit()
+    orphaned = update(CrawlJob).where(
+        col(CrawlJob.status) == "waiting", col(CrawlJob.leader_job_id).is_(None)
+    )
+    session.execute(orphaned.values(status="queued"))
+    session.commit()
+    return len(stale_jobs)
+
+
+def get_cached_scrapped_history(
+    *,
+    session: Session,
+    city: str,
+    price_min: float,
+    price_max: float,
+    stars: float,
+    max_age: timedelta,
+    exact: bool = True,
+) -> ScrappedItemsHistory | None:
+    """
+    Get the latest completed history with exactly these parameters that was
+    crawled within max_age. Crawls always check in on the next day, so only
+    histories from today are considered.
+
+    Only histories crawled by a job of their own count. Copies of a crawl's
+    items, made from the cache or for a waiting job, are younger than the
+    crawl and would otherwise keep it cached past max_age.
+
+    With exact=False, a history crawled over a wider price range also
+    matches, its items then have to be filtered by price.
+    """
+    now = datetime.now()
+    not_before = max(now - max_age, now.replace(hour=0, minute=0, second=0))
+    crawled = select(CrawlJob.id).where(
+        CrawlJob.history_id == ScrappedItemsHistory.id,
+        col(CrawlJob.leader_job_id).is_(None),
+    )
+    statement = select(ScrappedItemsHistory).where(
+        ScrappedItemsHistory.scrape_status == "completed",
+        ScrappedItemsHistory.city == city,
+        ScrappedItemsHistory.stars == stars,
+        col(ScrappedItemsHistory.scrapped_time) >= not_before,
+        crawled.exists(),
+    )
+    if exact:
+        statement = statement.where(
+            ScrappedItemsHistory.price_min == price_min,
+            ScrappedItemsHistory.price_max == price_max,
+        )
+    else:
+        statement = statement.where(
+            col(ScrappedItemsHistory.price_min) <= price_min,
+            col(ScrappedItemsHistory.price_max) >= price_max,
+        )
+    statement = statement.order_by(
+        col(ScrappedItemsHistory.scrapped_time).desc()
+    ).limit(1)
+    return session.exec(statement).first()
+
+
+def copy_scrapped_items(
+    *,
+    session: Session,
+    source_history_id: uuid.UUID,
+    history_id: uuid.UUID,
+    price_min: float | None = None,
+    price_max: float | None = None,
+) -> None:
+    """
+    Copy the scrapped items of a history into another one, in a single
+    INSERT ... SELECT, optionally only those with a booking.com price in
+    [price_min, price_max]. The caller commits.
+    """
+    columns = [
+        "title",
+        "price_booking",
+        "url_booking",
+        "stars",
+        "image_url",
+        "price_agoda",
+        "url_agoda",
+        "created_at",
+        "updated_at",
+    ]
+    source = select(  # type: ignore[call-overload]
+        func.uuid_generate_v4(),
+        *[getattr(ScrappedItem, column) for column in columns],
+        literal(history_id),
+    ).where(ScrappedItem.history_id == source_history_id)
+    if price_min is not None:
+        source = source.where(col(ScrappedItem.price_booking) >= price_min)
+    if price_max is not None:
+        source = source.where(col(ScrappedItem.price_booking) <= price_max)
+    statement = insert(ScrappedItem).from_select(["id", *columns, "history_id"], source)
+    session.execute(statement)
+
+
+def update_agoda_prices(
+    *, session: Session, prices: list[tuple[uuid.UUID, float, str]]
+) -> None:
+    """
+    Set price_agoda and url_agoda of scrapped items from (id, price_agoda,
+    url_agoda) tuples, in a single UPDATE ... FROM unnest(...). The caller
+    commits.
+    """
+    if not prices:
+        return
+    ids, agoda_prices, urls = zip(*prices, strict=True)
+    # Three array parameters instead of three parameters per row
+    matched = (
+        func.unnest(
+            bindparam("ids", list(ids), type_=ARRAY(Uuid)),
+            bindparam("prices", list(agoda_prices), type_=ARRAY(Float)),
+            bindparam("urls", list(urls), type_=ARRAY(String)),
+        )
+        .table_valued("id", "price_agoda", "url_agoda")
+        .render_derived(name="matched")
+    )
+    statement = (
+        update(ScrappedItem)
+        .where(col(ScrappedItem.id) == matched.c.id)
+        .values(
+            price_agoda=matched.c.price_agoda,
+            url_agoda=matched.c.url_agoda,
+            updated_at=datetime.now(),
+        )
+        # Items loaded in the session keep their old values until refreshed
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(statement)
+
+
+def get_hotels(
+    *, session: Session, urls_booking: list[str], urls_agoda: list[str]
+) -> list[Hotel]:
+    """
+    Get the registered hotels with one of the given booking.com or Agoda URLs.
+    """
+    statement = select(Hotel).where(
+        or_(
+            col(Hotel.url_booking).in_(urls_booking),
+            col(Hotel.url_agoda).in_(urls_agoda),
+        )
+    )
+    return list(session.exec(statement).all())
+
+
+def register_hotels(
+    *, session: Session, city: str, pairs: list[tuple[str, str, str]]
+) -> None:
+    """
+    Record (title, url_booking, url_agoda) pairs in the hotel registry. A
+    booking.com URL that is already registered gets the new Agoda URL, which
+    is taken away from any hotel it was registered with before. The caller
+    commits.
+    """
+    rows = []
+    seen_booking: set[str] = set()
+    seen_agoda: set[str] = set()
+    now = datetime.now()
+    for title, url_booking, url_agoda in pairs:
+        # A statement can't upsert the same row twice
+        if url_booking in seen_booking or url_agoda in seen_agoda:
+            continue
+        seen_booking.add(url_booking)
+        seen_agoda.add(url_agoda)
+        rows.append(
+            {
+                "id": uuid.uuid4(),
+                "city": city,
+                "title": title,
+                "normalized_title": normalize_title(title),
+                "url_booking": url_booking,
+                "url_agoda": url_agoda,
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+    if not rows:
+        return
+    # Concurrent crawls of a city would register the same hotels
+    session.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"hotel|{city}"))))
+    session.execute(
+        update(Hotel).where(col(Hotel.url_agoda).in_(seen_agoda)).values(url_agoda=None)
+    )
+    statement = pg_insert(Hotel).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Hotel.url_booking],
+        set_={
+            "url_agoda": statement.excluded.url_agoda,
+            "updated_at": statement.excluded.updated_at,
+        },
+    )
+    session.execute(statement)
+
+
+def get_agoda_city_id(*, session: Session, city: str, max_age: timedelta) -> int | None:
+    """
+    Get the cached Agoda ID of a city if it was looked up within max_age.
+    """
+    statement = select(AgodaCity.agoda_city_id).where(
+        AgodaCity.city == city,
+        col(AgodaCity.updated_at) >= datetime.now() - max_age,
+    )
+    return session.exec(statement).first()
+
+
+def save_agoda_city_id(*, session: Session, city: str, agoda_city_id: int) -> None:
+    now = datetime.now()
+    statement = pg_insert(AgodaCity).values(
+        id=uuid.uuid4(),
+        city=city,
+        agoda_city_id=agoda_city_id,
+        created_at=now,
+        updated_at=now,
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[AgodaCity.city],
+        set_={
+            "agoda_city_id": statement.excluded.agoda_city_id,
+            "updated_at": statement.excluded.updated_at,
+        },
+    )
+    session.execute(statement)
+    session.commit()
@@ -0,0 +1,506 @@
+"""
+Matching of Agoda hotel titles to booking.com hotel titles.
+
+An engine scores pairs of titles and returns those scoring above the
+threshold as (query index, candidate index, score) triples. The difflib and
+indexed engines score with ``similar``, the tfidf engine with the cosine
+similarity of character trigram TF-IDF vectors. ``match_titles`` then pairs
+each Agoda title with at most one booking.com title, either the best scoring
+one ("greedy") or through a one-to-one assignment maximizing the total score
+("optimal").
+"""
+
+import math
+import multiprocessing
+import re
+from collections import Counter, defaultdict
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from typing import Any, Protocol
+
+import numpy as np
+from scipy import sparse  # type: ignore[import-untyped]
+from scipy.optimize import linear_sum_assignment  # type: ignore[import-untyped]
+
+DEFAULT_THRESHOLD = 0.8
+# Tuned on the synthetic benchmark data (app.benchmarks.matching). With optimal
+# assignment this keeps precision at or above the indexed engine's default, at
+# a similar recall; lower thresholds pair many Agoda titles without a
+# booking.com counterpart with the wrong hotel
+TFIDF_THRESHOLD = 0.8
+# Pairs whose star ratings differ by more than this are ruled out, where both
+# ratings are known
+STARS_TOLERANCE = 1.0
+
+Pair = tuple[int, int, float]
+PairFilter = Callable[[int, int], bool]
+
+
+class MatchEngine(Protocol):
+    def __call__(
+        self,
+        queries: Sequence[str],
+        candidates: Sequence[str],
+        threshold: float,
+        allowed: PairFilter | None = None,
+        best_only: bool = False,
+    ) -> list[Pair]: ...
+
+
+def normalize_title(title: str) -> str:
+    return " ".join(re.sub(r"\W+", " ", title.lower()).split())
+
+
+def similar(a: str, b: str) -> float:
+    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+
+
+def score_pairs_difflib(
+    queries: Sequence[str],
+    candidates: Sequence[str],
+    threshold: float = DEFAULT_THRESHOLD,
+    allowed: PairFilter | None = None,
+    best_only: bool = False,
+) -> list[Pair]:
+    """
+    Score every query against every candidate. With best_only, only the best
+    pair of each query is returned (the first one on ties).
+    """
+    pairs = []
+    for i, query in enumerate(queries):
+        best: Pair | None = None
+        for j, candidate in enumerate(candidates):
+            if allowed is not None and not allowed(i, j):
+                continue
+            score = similar(query, candidate)
+            if score <= threshold:
+                continue
+            if not best_only:
+                pairs.append((i, j, score))
+            elif best is None or score > best[2]:
+                best = (i, j, score)
+        if best is not None:
+            pairs.append(best)
+    return pairs
+
+
+def _bigrams(text: str) -> frozenset[tuple[str, int]]:
+    # Numbering repeated bigrams turns the bigram multiset into a set, so that
+    # set intersections count the shared bigrams with multiplicity
+    seen: Counter[str] = Counter()
+    grams = []
+    for i in range(len(text) - 1):
+        gram = text[i : i + 2]
+        grams.append((gram, seen[gram]))
+        seen[gram] += 1
+    return frozenset(grams)
+
+
+def _min_shared_bigrams(total_length: int, threshold: float) -> int:
+    # SequenceMatcher's ratio is 2 * M / T for M matched characters. Its
+    # matching blocks are separated by unmatched characters, so there are at
+    # most T - 2 * M + 1 of them, and a block of L characters shares L - 1
+    # bigrams. A ratio above the threshold therefore needs more than
+    # (1.5 * threshold - 1) * T - 1 shared bigrams.
+    bound = (1.5 * threshold - 1) * total_length - 1 - 1e-9
+    return max(math.floor(bound) + 1, 0)
+
+
+class _BigramIndex:
+    """
+    Inverted index from the bigrams of the candidates to the candidates
+    containing them.
+    """
+
+    def __init__(self, candidates: Sequence[str]) -> None:
+        self.texts = [candidate.lower() for candidate in candidates]
+        self.grams = [_bigrams(text) for text in self.texts]
+        self.postings: defaultdict[tuple[str, int], list[int]] = defaultdict(list)
+        for index, grams in enumerate(self.grams):
+            for gram in grams:
+                self.postings[gram].append(index)
+        # SequenceMatcher caches what it knows about its second sequence
+        self.matchers = []
+        for text in self.texts:
+            matcher = SequenceMatcher(None)
+            matcher.set_seq2(text)
+            self.matchers.append(matcher)
+
+    def candidates_for(self, query: str, threshold: float) -> list[int]:
+        """
+        Indexes of the candidates that may score above the threshold against
+        the query, in ascending order.
+        """
+        grams = _bigrams(query)
+        # A candidate shorter than this can't score above the threshold, and
+        # must share at least min_shared bigrams with the query
+        min_length = math.floor(threshold * len(query) / (2 - threshold)) + 1
+        min_shared = _min_shared_bigrams(len(query) + min_length, threshold)
+        if min_shared == 0:
+            return list(range(len(self.texts)))
+        # Any candidate sharing min_shared bigrams with the query contains one
+        # of its len(grams) - min_shared + 1 rarest bigrams
+        by_rarity = sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))
+        found: set[int] = set()
+        for gram in by_rarity[: len(grams) - min_shared + 1]:
+            found.update(self.postings.get(gram, ()))
+        return sorted(found)
+
+
+def score_pairs_indexed(
+    queries: Sequence[str],
+    candidates: Sequence[str],
+    threshold: float = DEFAULT_THRESHOLD,
+    allowed: PairFilter | None = None,
+    best_only: bool = False,
+) -> list[Pair]:
+    """
+    Score each query only against the candidates it shares enough rare
+    bigrams with, and skip those whose length or character counts already
+    bound their score below the threshold, or with best_only below the best
+    score so far. Gives the same pairs as score_pairs_difflib.
+    """
+    return _score_pairs_with_index(
+        _BigramIndex(candidates), queries, threshold, allowed, best_only
+    )
+
+
+def _score_pairs_with_index(
+    index: _BigramIndex,
+    queries: Sequence[str],
+    threshold: float,
+    allowed: PairFilter | None,
+    best_only: bool,
+) -> list[Pair]:
+    pairs = []
+    for i, query in enumerate(queries):
+        text = query.lower()
+        grams = _bigrams(text)
+        best: Pair | None = None
+        bound = threshold
+        for j in index.candidates_for(text, threshold):
+            if allowed is not None and not allowed(i, j):
+                continue
+            total_length = len(text) + len(index.texts[j])
+            shortest = min(len(text), len(index.texts[j]))
+            if total_length and 2 * shortest / total_length <= bound:
+                continue
+            if len(grams & index.grams[j]) < _min_shared_bigrams(total_length, bound):
+                continue
+            matcher = index.matchers[j]
+            matcher.set_seq1(text)
+            if matcher.quick_ratio() <= bound:
+                continue
+            score = matcher.ratio()
+            if score <= bound:
+                continue
+            if best_only:
+                best = (i, j, score)
+                bound = score
+            else:
+                pairs.append((i, j, score))
+        if best is not None:
+            pairs.append(best)
+    return pairs
+
+
+# Rows of the similarity matrix computed at once by the tfidf engine, bounds
+# its memory use as titles sharing common trigrams make the matrix dense
+TFIDF_BLOCK_ROWS = 1024
+
+
+def _trigrams(text: str) -> Counter[str]:
+    text = " " + " ".join(text.lower().split()) + " "
+    return Counter(text[i : i + 3] for i in range(len(text) - 2))
+
+
+def _tfidf_vectors(
+    titles: Sequence[str], vocabulary: dict[str, int], idf: np.ndarray
+) -> sparse.csr_matrix:
+    indptr = [0]
+    indices: list[int] = []
+    data: list[float] = []
+    for title in titles:
+        for gram, count in _trigrams(title).items():
+            indices.append(vocabulary[gram])
+            data.append(count)
+        indptr.append(len(indices))
+    vectors = sparse.csr_matrix(
+        (np.array(data, dtype=np.float64), indices, indptr),
+        shape=(len(titles), len(vocabulary)),
+    )
+    vectors = vectors.multiply(idf).tocsr()
+    norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1))).ravel()
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ vectors)
+
+
+def score_pairs_tfidf(
+    queries: Sequence[str],
+    candidates: Sequence[str],
+    threshold: float = TFIDF_THRESHOLD,
+    allowed: PairFilter | None = None,
+    best_only: bool = False,
+) -> list[Pair]:
+    """
+    Encode the titles as L2 normalized character trigram TF-IDF vectors, with
+    document frequencies counted over both lists, and score all pairs with one
+    sparse matrix product per block of queries.
+    """
+    if not queries or not candidates:
+        return []
+    vocabulary: dict[str, int] = {}
+    document_frequency: Counter[str] = Counter()
+    for title in [*queries, *candidates]:
+        grams = _trigrams(title)
+        document_frequency.update(grams.keys())
+        for gram in grams:
+            vocabulary.setdefault(gram, len(vocabulary))
+    documents = len(queries) + len(candidates)
+    idf = np.empty(len(vocabulary))
+    for gram, index in vocabulary.items():
+        idf[index] = math.log((1 + documents) / (1 + document_frequency[gram])) + 1
+    query_vectors = _tfidf_vectors(queries, vocabulary, idf)
+    candidate_vectors = _tfidf_vectors(candidates, vocabulary, idf).T.tocsr()
+
+    pairs = []
+    for start in range(0, len(queries), TFIDF_BLOCK_ROWS):
+        scores = (
+            query_vectors[start : start + TFIDF_BLOCK_ROWS] @ candidate_vectors
+        ).tocoo()
+        above = scores.data > threshold
+        block_pairs = sorted(
+            (int(i) + start, int(j), float(score))
+            for i, j, score in zip(
+                scores.row[above], scores.col[above], scores.data[above], strict=True
+            )
+            if allowed is None or allowed(int(i) + start, int(j))
+        )
+        if best_only:
+            best: dict[int, Pair] = {}
+            for pair in block_pairs:
+                if pair[0] not in best or pair[2] > best[pair[0]][2]:
+                    best[pair[0]] = pair
+            block_pairs = list(best.values())
+        pairs.extend(block_pairs)
+    return pairs
+
+
+ENGINES: dict[str, MatchEngine] = {
+    "difflib": score_pairs_difflib,
+    "indexed": score_pairs_indexed,
+    "tfidf": score_pairs_tfidf,
+}
+DEFAULT_THRESHOLDS = {
+    "difflib": DEFAULT_THRESHOLD,
+    "indexed": DEFAULT_THRESHOLD,
+    "tfidf": TFIDF_THRESHOLD,
+}
+
+
+def assign_greedy(pairs: Sequence[Pair], queries: int) -> list[int | None]:
+    """
+    Pick the best scoring pair of each query (the first one on ties). Several
+    queries may get the same candidate.
+    """
+    best: dict[int, Pair] = {}
+    for pair in pairs:
+        i = pair[0]
+        if i not in best or (pair[2], -pair[1]) > (best[i][2], -best[i][1]):
+            best[i] = pair
+    return [best[i][1] if i in best else None for i in range(queries)]
+
+
+def assign_optimal(pairs: Sequence[Pair], queries: int) -> list[int | None]:
+    """
+    Pick the one-to-one subset of the pairs with the highest total score. The
+    pairs form a sparse bipartite graph, so the assignment is solved for each
+    of its connected components on its own.
+    """
+    # Union-find over queries (i) and candidates (~j, always negative)
+    parents: dict[int, int] = {}
+
+    def find(node: int) -> int:
+        parents.setdefault(node, node)
+        while parents[node] != node:
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
+
+    for i, j, _ in pairs:
+        parents[find(i)] = find(~j)
+    components: defaultdict[int, list[Pair]] = defaultdict(list)
+    for pair in pairs:
+        components[find(pair[0])].append(pair)
+
+    matches: list[int | None] = [None] * queries
+    for component in components.values():
+        if len(component) == 1:
+            i, j, _ = component[0]
+            matches[i] = j
+            continue
+        rows = sorted({i for i, _, _ in component})
+        columns = sorted({j for _, j, _ in component})
+        row_index = {i: n for n, i in enumerate(rows)}
+        column_index = {j: n for n, j in enumerate(columns)}
+        # Pairs missing from the graph weigh 0, below any pair in it
+        weights = np.zeros((len(rows), len(columns)))
+        for i, j, score in component:
+            weights[row_index[i], column_index[j]] = score
+        assigned = linear_sum_assignment(weights, maximize=True)
+        for r, c in zip(*assigned, strict=True):
+            if weights[r, c] > 0:
+                matches[rows[r]] = columns[c]
+    return matches
+
+
+ASSIGNMENTS = {
+    "greedy": assign_greedy,
+    "optimal": assign_optimal,
+}
+
+
+def _stars_filter(
+    query_stars: Sequence[float | None], candidate_stars: Sequence[float | None]
+) -> PairFilter:
+    def allowed(i: int, j: int) -> bool:
+        # Unknown ratings come as None or 0
+        a, b = query_stars[i], candidate_stars[j]
+        return not a or not b or abs(a - b) <= STARS_TOLERANCE
+
+    return allowed
+
+
+# Set in each worker process of score_pairs_parallel by _init_worker
+_worker: dict[str, Any] = {}
+
+
+def _init_worker(
+    engine: str,
+    candidates: Sequence[str],
+    candidate_stars: Sequence[float | None] | None,
+    threshold: float,
+    best_only: bool,
+) -> None:
+    _worker.update(
+        engine=engine,
+        candidates=candidates,
+        candidate_stars=candidate_stars,
+        threshold=threshold,
+        best_only=best_only,
+        # Built once per process, not once per shard
+        index=_BigramIndex(candidates) if engine == "indexed" else None,
+    )
+
+
+def _score_shard(
+    start: int, queries: Sequence[str], query_stars: Sequence[float | None] | None
+) -> list[Pair]:
+    allowed = None
+    if query_stars is not None and _worker["candidate_stars"] is not None:
+        allowed = _stars_filter(query_stars, _worker["candidate_stars"])
+    if _worker["index"] is not None:
+        pairs = _score_pairs_with_index(
+            _worker["index"],
+            queries,
+            _worker["threshold"],
+            allowed,
+            _worker["best_only"],
+        )
+    else:
+        pairs = ENGINES[_worker["engine"]](
+            queries,
+            _worker["candidates"],
+            _worker["threshold"],
+            allowed=allowed,
+            best_only=_worker["best_only"],
+        )
+    return [(start + i, j, score) for i, j, score in pairs]
+
+
+def score_pairs_parallel(
+    queries: Sequence[str],
+    candidates: Sequence[str],
+    threshold: float,
+    engine: str,
+    processes: int,
+    query_stars: Sequence[float | None] | None = None,
+    candidate_stars: Sequence[float | None] | None = None,
+    best_only: bool = False,
+) -> list[Pair]:
+    """
+    Shard the queries across a pool of processes. Every worker receives the
+    candidates once, through the pool initializer, and the shards are merged
+    back in query order, so the pairs are the same as from the engine itself.
+    """
+    # A few shards per process even out shards that take longer than others
+    shard_size = math.ceil(len(queries) / (processes * 4))
+    shards = range(0, len(queries), shard_size)
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        # Forking the crawl worker would copy the state of its reactor thread
+        mp_context=multiprocessing.get_context("forkserver"),
+        initializer=_init_worker,
+        initargs=(engine, candidates, candidate_stars, threshold, best_only),
+    ) as executor:
+        results = executor.map(
+            _score_shard,
+            shards,
+            [queries[start : start + shard_size] for start in shards],
+            [
+                query_stars[start : start + shard_size] if query_stars else None
+                for start in shards
+            ],
+        )
+        return [pair for shard in results for pair in shard]
+
+
+def match_titles(
+    queries: Sequence[str],
+    candidates: Sequence[str],
+    threshold: float | None = None,
+    engine: str = "indexed",
+    assignment: str = "optimal",
+    query_stars: Sequence[float | None] | None = None,
+    candidate_stars: Sequence[float | None] | None = None,
+    processes: int = 1,
+    parallel_min_queries: int = 0,
+) -> list[int | None]:
+    """
+    Return, for each query, the index of the candidate it is matched with, or
+    None. Given the star ratings of both lists, pairs whose ratings differ by
+    more than STARS_TOLERANCE are never matched.
+
+    With processes > 1 and at least parallel_min_queries queries, the difflib
+    and indexed engines score shards of the queries in separate processes.
+    The tfidf engine always runs in-process, its IDF weights depend on all
+    titles at once.
+    """
+    if threshold is None:
+        threshold = DEFAULT_THRESHOLDS[engine]
+    # Greedy assignment only looks at the best pair of each query
+    best_only = assignment == "greedy"
+    if (
+        processes > 1
+        and engine != "tfidf"
+        and len(queries) >= max(parallel_min_queries, 2)
+    ):
+        pairs = score_pairs_parallel(
+            queries,
+            candidates,
+            threshold,
+            engine,
+            processes,
+            query_stars=query_stars,
+            candidate_stars=candidate_stars,
+            best_only=best_only,
+        )
+        return ASSIGNMENTS[assignment](pairs, len(queries))
+    allowed = None
+    if query_stars is not None and candidate_stars is not None:
+        allowed = _stars_filter(query_stars, candidate_stars)
+    pairs = ENGINES[engine](
+        queries, candidates, threshold, allowed=allowed, best_only=best_only
+    )
+    return ASSIGNMENTS[assignment](pairs, len(queries))
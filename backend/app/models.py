@@ -219,3 +219,53 @@ class BookMarkedScrappedItemCreate(SQLModel):
 
 class ScrappedItemCreate(ScrappedItemBase):
     pass
+
+
+# Durable crawl queue, claimed by app.crawl_worker with FOR UPDATE SKIP LOCKED
+class CrawlJob(SQLModel, table=True):
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    history_id: uuid.UUID = Field(
+        foreign_key="scrappeditemshistory.id",
+        nullable=False,
+        ondelete="CASCADE",
+        index=True,
+    )
+    city: str = Field(min_length=1, max_length=255)
+    price_min: float = Field(ge=0)
+    price_max: float = Field(ge=0)
+    stars: float = Field(ge=0, le=5)
+    # queued, running, completed or failed, or waiting for the results of the
+    # identical crawl leader_job_id
+    status: str = Field(default="queued", max_length=255, index=True)
+    leader_job_id: uuid.UUID | None = Field(
+        default=None, foreign_key="crawljob.id", ondelete="SET NULL", index=True
+    )
+    attempts: int = Field(default=0, ge=0)
+    worker_id: str | None = Field(default=None, max_length=255)
+    error: str | None = Field(default=None)
+    created_at: datetime = Field(default_factory=datetime.now)
+    started_at: datetime | None = Field(default=None)
+    heartbeat_at: datetime | None = Field(default=None)
+    finished_at: datetime | None = Field(default=None)
+
+
+# Hotels paired across booking.com and Agoda by earlier crawls, so that later
+# crawls can pair them by URL instead of by title similarity
+class Hotel(SQLModel, table=True):
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    city: str = Field(max_length=255, index=True)
+    title: str = Field(max_length=255)
+    normalized_title: str = Field(max_length=255, index=True)
+    url_booking: str = Field(unique=True, index=True)
+    url_agoda: str | None = Field(default=None, unique=True, index=True)
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+
+# Agoda's ID of each searched city, looked up once instead of before every crawl
+class AgodaCity(SQLModel, table=True):
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    city: str = Field(max_length=255, unique=True, index=True)
+    agoda_city_id: int
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
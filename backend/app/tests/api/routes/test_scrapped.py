@@ -0,0 +1,152 @@
+import uuid
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models import CrawlJob, ScrappedItem
+from app.tests.utils.scrapped import (
+    create_crawled_history,
+    create_random_scrapped_item,
+)
+from app.tests.utils.utils import random_lower_string
+
+
+def test_create_scrapped_history_queues_crawl(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    data = {"city": random_lower_string(), "price_min": 1000, "price_max": 9000}
+    response = client.post(
+        f"{settings.API_V1_STR}/scrapped/history",
+        headers=superuser_token_headers,
+        json=data,
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["scrape_status"] == "pending"
+
+    job = db.exec(
+        select(CrawlJob).where(CrawlJob.history_id == uuid.UUID(content["id"]))
+    ).one()
+    assert job.status == "queued"
+    assert job.city == data["city"]
+    assert job.price_min == 1000
+    assert job.price_max == 9000
+    assert job.stars == 3
+
+
+def test_create_scrapped_history_reuses_recent_crawl(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    cached = create_crawled_history(db, city=random_lower_string())
+    create_random_scrapped_item(db, history_id=cached.id)
+    create_random_scrapped_item(db, history_id=cached.id)
+
+    data = {
+        "city": cached.city,
+        "price_min": cached.price_min,
+        "price_max": cached.price_max,
+        "stars": cached.stars,
+    }
+    response = client.post(
+        f"{settings.API_V1_STR}/scrapped/history",
+        headers=superuser_token_headers,
+        json=data,
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["scrape_status"] == "completed"
+    history_id = uuid.UUID(content["id"])
+    assert history_id != cached.id
+
+    items = db.exec(
+        select(ScrappedItem).where(ScrappedItem.history_id == history_id)
+    ).all()
+    assert len(items) == 2
+    jobs = db.exec(select(CrawlJob).where(CrawlJob.history_id == history_id)).all()
+    assert jobs == []
+
+
+def test_create_scrapped_history_ignores_copies_of_expired_crawl(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    crawled = create_crawled_history(db, city=random_lower_string())
+    create_random_scrapped_item(db, history_id=crawled.id)
+    data = {
+        "city": crawled.city,
+        "price_min": crawled.price_min,
+        "price_max": crawled.price_max,
+        "stars": crawled.stars,
+    }
+    response = client.post(
+        f"{settings.API_V1_STR}/scrapped/history",
+        headers=superuser_token_headers,
+        json=data,
+    )
+    assert response.json()["scrape_status"] == "completed"
+
+    # The copy made above is newer, but the crawl it came from has expired
+    crawled.scrapped_time = datetime(2000, 1, 1)
+    db.add(crawled)
+    db.commit()
+    response = client.post(
+        f"{settings.API_V1_STR}/scrapped/history",
+        headers=superuser_token_headers,
+        json=data,
+    )
+    assert response.json()["scrape_status"] == "pending"
+
+
+def test_create_scrapped_history_filters_wider_recent_crawl(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    cached = create_crawled_history(db, city=random_lower_string())
+    for price_booking in (2000, 5000, 20000):
+        create_random_scrapped_item(
+            db, history_id=cached.id, price_booking=price_booking
+        )
+
+    data = {
+        "city": cached.city,
+        "price_min": 3000,
+        "price_max": 10000,
+        "stars": cached.stars,
+    }
+    response = client.post(
+        f"{settings.API_V1_STR}/scrapped/history",
+        headers=superuser_token_headers,
+        json=data,
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["scrape_status"] == "completed"
+    history_id = uuid.UUID(content["id"])
+
+    items = db.exec(
+        select(ScrappedItem).where(ScrappedItem.history_id == history_id)
+    ).all()
+    assert [item.price_booking for item in items] == [5000]
+    jobs = db.exec(select(CrawlJob).where(CrawlJob.history_id == history_id)).all()
+    assert jobs == []
+
+
+def test_create_scrapped_history_waits_for_identical_crawl(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    data = {"city": random_lower_string(), "price_min": 2000, "price_max": 8000}
+    responses = [
+        client.post(
+            f"{settings.API_V1_STR}/scrapped/history",
+            headers=superuser_token_headers,
+            json=data,
+        )
+        for _ in range(2)
+    ]
+    first_id, second_id = (uuid.UUID(r.json()["id"]) for r in responses)
+
+    leader = db.exec(select(CrawlJob).where(CrawlJob.history_id == first_id)).one()
+    follower = db.exec(select(CrawlJob).where(CrawlJob.history_id == second_id)).one()
+    assert leader.status == "queued"
+    assert follower.status == "waiting"
+    assert follower.leader_job_id == leader.id
@@ -0,0 +1,46 @@
+import json
+from pathlib import Path
+
+from app.benchmarks.matching import main, replay_dataset, synthetic_dataset
+
+
+def test_synthetic_dataset() -> None:
+    dataset = synthetic_dataset(60, seed=1)
+    assert len(dataset.booking) == len(dataset.agoda) == 60
+    assert dataset.truth is not None
+    assert sum(true is not None for true in dataset.truth) == 40
+    assert dataset == synthetic_dataset(60, seed=1)
+
+
+def test_replay_dataset(tmp_path: Path) -> None:
+    booking = [
+        {"title": "Amari Dhaka", "url": "https://b/1", "stars": 5},
+        {"title": "Hotel Sea Crown", "url": "https://b/2", "stars": 3},
+    ]
+    agoda = [{"title": "Sea Crown Hotel", "url": "https://a/1", "stars": 3}]
+    pairs = [{"url_booking": "https://b/2", "url_agoda": "https://a/1"}]
+    for name, lines in (("booking", booking), ("agoda", agoda), ("pairs", pairs)):
+        (tmp_path / f"{name}.jsonl").write_text(
+            "\n".join(json.dumps(line) for line in lines)
+        )
+    dataset = replay_dataset(tmp_path)
+    assert dataset.agoda == ["Sea Crown Hotel"]
+    assert dataset.truth == [1]
+
+
+def test_main(tmp_path: Path) -> None:
+    output = tmp_path / "results.json"
+    main(["--sizes", "50", "--engines", "indexed", "--json", str(output)])
+    results = json.loads(output.read_text())
+    assert [(r["engine"], r["assignment"]) for r in results] == [
+        ("indexed", "greedy"),
+        ("indexed", "optimal"),
+    ]
+    assert all(r["precision"] > 0.8 and r["recall"] > 0.5 for r in results)
+
+
+def test_tfidf_default_threshold_precision(tmp_path: Path) -> None:
+    output = tmp_path / "results.json"
+    main(["--sizes", "1000", "--engines", "tfidf", "--json", str(output)])
+    results = json.loads(output.read_text())
+    assert all(r["precision"] > 0.9 and r["recall"] > 0.7 for r in results)
@@ -0,0 +1,233 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import Session
+
+from app import crud
+from app.models import CrawlJob, ScrappedItemsHistory
+from app.tests.utils.scrapped import (
+    create_random_history,
+    create_random_scrapped_item,
+)
+
+
+def create_oldest_job(db: Session) -> CrawlJob:
+    history = create_random_history(db)
+    job = crud.create_crawl_job(
+        session=db,
+        history_id=history.id,
+        city=history.city,
+        price_min=1500,
+        price_max=25500,
+        stars=3,
+    )
+    # Make sure this job is first in line, whatever else is in the queue
+    job.created_at = datetime(2000, 1, 1)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def test_create_crawl_job(db: Session) -> None:
+    history = create_random_history(db)
+    job = crud.create_crawl_job(
+        session=db,
+        history_id=history.id,
+        city=history.city,
+        price_min=1500,
+        price_max=25500,
+        stars=3,
+    )
+    assert job.status == "queued"
+    assert job.attempts == 0
+    assert job.history_id == history.id
+
+
+def test_claim_crawl_job(db: Session) -> None:
+    job = create_oldest_job(db)
+    claimed = crud.claim_crawl_job(session=db, worker_id="worker-1")
+    assert claimed
+    assert claimed.id == job.id
+    assert claimed.status == "running"
+    assert claimed.attempts == 1
+    assert claimed.worker_id == "worker-1"
+    assert claimed.heartbeat_at
+
+
+def start_job(db: Session, job: CrawlJob, heartbeat_at: datetime | None = None) -> None:
+    """
+    Run the job as a worker would after claiming it, whatever its place in the
+    queue.
+    """
+    db.refresh(job)
+    job.status = "running"
+    job.attempts += 1
+    job.worker_id = "worker-1"
+    job.heartbeat_at = heartbeat_at or datetime.now()
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+
+def finish_job(db: Session, job: CrawlJob, error: str | None = None) -> None:
+    start_job(db, job)
+    crud.finish_crawl_job(
+        session=db,
+        job_id=job.id,
+        worker_id="worker-1",
+        attempts=job.attempts,
+        error=error,
+    )
+
+
+def test_finish_crawl_job(db: Session) -> None:
+    job = create_oldest_job(db)
+    finish_job(db, job, error="boom")
+    db.refresh(job)
+    assert job.status == "failed"
+    assert job.error == "boom"
+    assert job.finished_at
+
+
+def test_finish_crawl_job_of_an_earlier_run(db: Session) -> None:
+    job = create_oldest_job(db)
+    start_job(db, job)
+    # Requeued and claimed again while the first run was stalled
+    start_job(db, job)
+
+    crud.finish_crawl_job(
+        session=db, job_id=job.id, worker_id="worker-1", attempts=1, error="boom"
+    )
+    db.refresh(job)
+    assert job.status == "running"
+    assert job.error is None
+    crud.finish_crawl_job(session=db, job_id=job.id, worker_id="worker-1", attempts=2)
+
+
+def test_heartbeat_crawl_job_of_an_earlier_run(db: Session) -> None:
+    job = create_oldest_job(db)
+    start_job(db, job)
+    stale_heartbeat = datetime.now() - timedelta(hours=1)
+    start_job(db, job, heartbeat_at=stale_heartbeat)
+
+    crud.heartbeat_crawl_job(
+        session=db, job_id=job.id, worker_id="worker-1", attempts=1
+    )
+    db.refresh(job)
+    assert job.heartbeat_at == stale_heartbeat
+    crud.heartbeat_crawl_job(
+        session=db, job_id=job.id, worker_id="worker-1", attempts=2
+    )
+    db.refresh(job)
+    assert job.heartbeat_at and job.heartbeat_at > stale_heartbeat
+    finish_job(db, job)
+
+
+def create_stale_job(db: Session) -> CrawlJob:
+    job = create_oldest_job(db)
+    start_job(db, job, heartbeat_at=datetime.now() - timedelta(hours=1))
+    return job
+
+
+def test_requeue_stale_crawl_jobs(db: Session) -> None:
+    job = create_stale_job(db)
+    crud.requeue_stale_crawl_jobs(
+        session=db, stale_after=timedelta(minutes=2), max_attempts=3
+    )
+    db.refresh(job)
+    assert job.status == "queued"
+    assert job.worker_id is None
+    # Don't leave the job in the queue for the other tests
+    finish_job(db, job)
+
+
+def test_requeue_stale_crawl_jobs_out_of_attempts(db: Session) -> None:
+    job = create_stale_job(db)
+    crud.requeue_stale_crawl_jobs(
+        session=db, stale_after=timedelta(minutes=2), max_attempts=1
+    )
+    db.refresh(job)
+    assert job.status == "failed"
+    history = db.get(ScrappedItemsHistory, job.history_id)
+    assert history
+    assert history.scrape_status.startswith("failed")
+
+
+def create_waiting_job(db: Session, leader: CrawlJob) -> CrawlJob:
+    history = create_random_history(db)
+    return crud.create_crawl_job(
+        session=db,
+        history_id=history.id,
+        city=leader.city,
+        price_min=leader.price_min,
+        price_max=leader.price_max,
+        stars=leader.stars,
+        leader_job_id=leader.id,
+    )
+
+
+def test_finish_crawl_job_hands_results_to_waiting_jobs(db: Session) -> None:
+    leader = create_oldest_job(db)
+    follower = create_waiting_job(db, leader)
+    assert follower.status == "waiting"
+    leader_history = db.get(ScrappedItemsHistory, leader.history_id)
+    assert leader_history
+    leader_history.scrape_status = "completed"
+    db.add(leader_history)
+    db.commit()
+    create_random_scrapped_item(db, history_id=leader.history_id)
+
+    finish_job(db, leader)
+    db.refresh(follower)
+    assert follower.status == "completed"
+    follower_history = db.get(ScrappedItemsHistory, follower.history_id)
+    assert follower_history
+    db.refresh(follower_history)
+    assert follower_history.scrape_status == "completed"
+    assert len(follower_history.scrapped_items) == 1
+
+
+def test_finish_failed_crawl_job_queues_one_waiting_job(db: Session) -> None:
+    leader = create_oldest_job(db)
+    follower = create_waiting_job(db, leader)
+    other_follower = create_waiting_job(db, leader)
+
+    finish_job(db, leader, error="boom")
+    db.refresh(follower)
+    db.refresh(other_follower)
+    assert follower.status == "queued"
+    assert follower.leader_job_id is None
+    # Still a single crawl for the others to wait for
+    assert other_follower.status == "waiting"
+    assert other_follower.leader_job_id == follower.id
+    finish_job(db, follower, error="boom")
+    finish_job(db, other_follower)
+
+
+def test_requeue_stale_crawl_jobs_releases_jobs_of_finished_leaders(
+    db: Session,
+) -> None:
+    leader = create_oldest_job(db)
+    follower = create_waiting_job(db, leader)
+    # Finished without handing its results over
+    leader.status = "failed"
+    db.add(leader)
+    db.commit()
+
+    crud.requeue_stale_crawl_jobs(
+        session=db, stale_after=timedelta(minutes=2), max_attempts=3
+    )
+    db.refresh(follower)
+    assert follower.status == "queued"
+    assert follower.leader_job_id is None
+    finish_job(db, follower)
+
+
+def test_crawl_params_key_ignores_number_types() -> None:
+    # As passed by the API with its defaults, and read back from a job
+    assert crud._crawl_params_key("Dhaka", 1500, 25500, 3) == (
+        crud._crawl_params_key("Dhaka", 1500.0, 25500.0, 3.0)
+    )
+    assert crud._crawl_params_key("Dhaka", 1500, 25500, 3.5) != (
+        crud._crawl_params_key("Dhaka", 1500, 25500, 3)
+    )
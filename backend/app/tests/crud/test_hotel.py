@@ -0,0 +1,55 @@
+from sqlmodel import Session
+
+from app import crud
+from app.tests.utils.utils import random_lower_string
+
+
+def random_hotel_url(site: str) -> str:
+    return f"https://www.{site}.com/hotel/{random_lower_string()}.html"
+
+
+def test_register_hotels(db: Session) -> None:
+    url_booking = random_hotel_url("booking")
+    url_agoda = random_hotel_url("agoda")
+    crud.register_hotels(
+        session=db,
+        city="Dhaka",
+        pairs=[("Hotel Sea-Crown", url_booking, url_agoda)],
+    )
+    db.commit()
+    hotels = crud.get_hotels(session=db, urls_booking=[url_booking], urls_agoda=[])
+    assert len(hotels) == 1
+    assert hotels[0].url_agoda == url_agoda
+    assert hotels[0].normalized_title == "hotel sea crown"
+
+
+def test_register_hotels_moves_agoda_url(db: Session) -> None:
+    url_booking = random_hotel_url("booking")
+    other_url_booking = random_hotel_url("booking")
+    url_agoda = random_hotel_url("agoda")
+    new_url_agoda = random_hotel_url("agoda")
+    crud.register_hotels(
+        session=db,
+        city="Dhaka",
+        pairs=[
+            ("Amari Dhaka", url_booking, url_agoda),
+            ("Amari Dhaka", url_booking, new_url_agoda),
+        ],
+    )
+    db.commit()
+    crud.register_hotels(
+        session=db,
+        city="Dhaka",
+        pairs=[
+            ("Amari Dhaka", url_booking, new_url_agoda),
+            ("Amari", other_url_booking, url_agoda),
+        ],
+    )
+    db.commit()
+    hotels = crud.get_hotels(
+        session=db, urls_booking=[url_booking, other_url_booking], urls_agoda=[]
+    )
+    assert {hotel.url_booking: hotel.url_agoda for hotel in hotels} == {
+        url_booking: new_url_agoda,
+        other_url_booking: url_agoda,
+    }
@@ -0,0 +1,33 @@
+from sqlmodel import Session
+
+from app import crud
+from app.tests.utils.scrapped import create_random_history, create_random_scrapped_item
+
+
+def test_update_agoda_prices(db: Session) -> None:
+    history = create_random_history(db)
+    first = create_random_scrapped_item(db, history_id=history.id)
+    second = create_random_scrapped_item(db, history_id=history.id)
+    unmatched = create_random_scrapped_item(db, history_id=history.id)
+
+    crud.update_agoda_prices(
+        session=db,
+        prices=[
+            (first.id, 6100.0, "https://www.agoda.com/first/hotel.html"),
+            (second.id, 4880.5, "https://www.agoda.com/second/hotel.html"),
+        ],
+    )
+    db.commit()
+    for item in (first, second, unmatched):
+        db.refresh(item)
+    assert (first.price_agoda, first.url_agoda) == (
+        6100.0,
+        "https://www.agoda.com/first/hotel.html",
+    )
+    assert second.price_agoda == 4880.5
+    assert unmatched.price_agoda is None
+    assert unmatched.url_agoda is None
+
+
+def test_update_agoda_prices_empty(db: Session) -> None:
+    crud.update_agoda_prices(session=db, prices=[])
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+import httpx
+from sqlmodel import Session
+
+from app import crud
+from app.agoda_cities import fetch_agoda_city_id, get_agoda_city_id
+from app.tests.utils.utils import random_lower_string
+
+
+def test_fetch_agoda_city_id() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.params["searchText"] == "Dhaka"
+        return httpx.Response(
+            200,
+            json={
+                "ViewModelList": [
+                    {"Name": "Dhaka Regency Hotel", "ObjectId": 1},
+                    {"Name": "Dhaka", "ObjectId": 14552},
+                ]
+            },
+        )
+
+    with httpx.Client(transport=httpx.MockTransport(handler)) as client:
+        assert fetch_agoda_city_id(client, "Dhaka") == 14552
+
+
+def test_get_agoda_city_id_from_cache(db: Session) -> None:
+    city = random_lower_string()
+    max_age = timedelta(days=1)
+    assert crud.get_agoda_city_id(session=db, city=city, max_age=max_age) is None
+
+    crud.save_agoda_city_id(session=db, city=city, agoda_city_id=1)
+    crud.save_agoda_city_id(session=db, city=city, agoda_city_id=2)
+    assert crud.get_agoda_city_id(session=db, city=city, max_age=max_age) == 2
+    assert (
+        crud.get_agoda_city_id(session=db, city=city, max_age=timedelta(seconds=-1))
+        is None
+    )
+    # Cached, so no lookup is made
+    assert get_agoda_city_id(session=db, city=city) == 2
@@ -0,0 +1,50 @@
+import json
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.agoda_sessions import AgodaSessionPool
+from app.core.config import settings
+
+
+def test_agoda_session_pool(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "AGODA_SESSION_POOL_SIZE", 2)
+    now = time.time()
+    warmed: list[dict[str, Any]] = []
+
+    def warm() -> dict[str, Any]:
+        state = {
+            "cookies": [
+                {"name": "session", "value": str(len(warmed)), "expires": -1},
+                # Expires before AGODA_SESSION_MAX_AGE_SECONDS
+                {"name": "token", "value": "x", "expires": now + 20 * 60},
+            ],
+            "origins": [],
+        }
+        warmed.append(state)
+        return state
+
+    pool = AgodaSessionPool()
+    pool._directory = tmp_path
+    monkeypatch.setattr(pool, "_warm", warm)
+    assert pool.checkout() is None
+
+    pool.refresh()
+    assert len(warmed) == 2
+    paths = {pool.checkout(), pool.checkout()}
+    assert paths == {str(tmp_path / "session-0.json"), str(tmp_path / "session-1.json")}
+    assert json.loads((tmp_path / "session-0.json").read_text()) == warmed[0]
+
+    # Nothing is due yet
+    pool.refresh()
+    assert len(warmed) == 2
+
+    # Warmed again ahead of the first cookie expiry
+    later = now + 20 * 60 - settings.AGODA_SESSION_REFRESH_MARGIN_SECONDS + 1
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert pool.checkout() is None
+    pool.refresh()
+    assert len(warmed) == 4
+    assert pool.checkout() is not None
@@ -0,0 +1,76 @@
+import sys
+from collections.abc import Generator
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.browser import BrowserService
+from app.core.config import settings
+
+# Stands in for Chromium, answering the DevTools version endpoint
+FAKE_BROWSER = f"""#!{sys.executable}
+import http.server, sys
+
+port = next(
+    int(arg.split("=", 1)[1])
+    for arg in sys.argv
+    if arg.startswith("--remote-debugging-port=")
+)
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b"{{}}")
+
+    def log_message(self, *args):
+        pass
+
+
+http.server.HTTPServer(("127.0.0.1", port), Handler).serve_forever()
+"""
+
+
+@pytest.fixture()
+def service(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Generator[BrowserService, None, None]:
+    executable = tmp_path / "browser"
+    executable.write_text(FAKE_BROWSER)
+    executable.chmod(0o755)
+    monkeypatch.setattr(settings, "BROWSER_EXECUTABLE", str(executable))
+    monkeypatch.setattr(settings, "BROWSER_RECYCLE_AFTER_JOBS", 2)
+    service = BrowserService()
+    yield service
+    service.stop()
+
+
+def test_browser_service_is_shared_and_recycled(service: BrowserService) -> None:
+    cdp_url = service.acquire()
+    assert httpx.get(f"{cdp_url}/json/version").status_code == 200
+    # A second crawl shares the browser, even once it is due for recycling
+    assert service.acquire() == cdp_url
+    assert service.acquire() == cdp_url
+    for _ in range(3):
+        service.release()
+
+    # Recycled once no crawl uses it
+    recycled_url = service.acquire()
+    assert recycled_url != cdp_url
+    with pytest.raises(httpx.ConnectError):
+        httpx.get(f"{cdp_url}/json/version")
+    service.release()
+
+
+def test_browser_service_restarts_dead_browser(service: BrowserService) -> None:
+    service.acquire()
+    service.release()
+    assert service._process is not None
+    service._process.kill()
+    service._process.wait()
+
+    cdp_url = service.acquire()
+    assert httpx.get(f"{cdp_url}/json/version").status_code == 200
+    service.release()
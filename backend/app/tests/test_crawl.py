@@ -0,0 +1,60 @@
+from sqlmodel import Session
+
+from app import crud
+from app.crawl import _agoda_price, _match_agoda_items
+from app.tests.utils.scrapped import create_random_history, create_random_scrapped_item
+from app.tests.utils.utils import random_lower_string
+
+
+def test_match_agoda_items(db: Session) -> None:
+    history = create_random_history(db)
+    registered = create_random_scrapped_item(db, history_id=history.id)
+    renamed = create_random_scrapped_item(db, history_id=history.id)
+    renamed.title = "Pan Pacific Sonargaon Dhaka"
+    unknown = create_random_scrapped_item(db, history_id=history.id)
+    unknown.title = "Hotel Sea Crown"
+    registered_url, renamed_url, unknown_url, other_url = (
+        f"https://www.agoda.com/{random_lower_string()}/hotel.html" for _ in range(4)
+    )
+    crud.register_hotels(
+        session=db,
+        city=history.city,
+        pairs=[(registered.title, registered.url_booking, registered_url)],
+    )
+    db.commit()
+
+    agoda_items = [
+        # Paired by URL although the titles don't look alike at all
+        {"title": "Some other name", "url": registered_url, "price": "$50"},
+        {"title": "Pan-Pacific Sonargaon, Dhaka", "url": renamed_url, "price": "$80"},
+        {"title": "Hotel Sea Crown Cox's", "url": unknown_url, "price": "$30"},
+        {"title": "Le Meridien", "url": other_url, "price": "$90"},
+    ]
+    pairs = _match_agoda_items(
+        db, history.city, [registered, renamed, unknown], agoda_items
+    )
+    db.commit()
+    assert [(db_item.id, item["url"]) for db_item, item in pairs] == [
+        (registered.id, registered_url),
+        (renamed.id, renamed_url),
+        (unknown.id, unknown_url),
+    ]
+
+    hotels = crud.get_hotels(
+        session=db,
+        urls_booking=[renamed.url_booking, unknown.url_booking],
+        urls_agoda=[],
+    )
+    assert {hotel.url_booking: hotel.url_agoda for hotel in hotels} == {
+        renamed.url_booking: renamed_url,
+        unknown.url_booking: unknown_url,
+    }
+
+
+def test_agoda_price() -> None:
+    assert _agoda_price({"price": "$50"}) == 50 * 122
+    assert _agoda_price({"price": "1,050.5"}) == 1050.5 * 122
+    # Hotels Agoda shows no price for are left unpriced
+    assert _agoda_price({"price": None}) is None
+    assert _agoda_price({}) is None
+    assert _agoda_price({"price": "Sold out"}) is None
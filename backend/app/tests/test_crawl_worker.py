@@ -0,0 +1,19 @@
+import pytest
+from sqlmodel import Session
+
+from app import crawl_worker
+from app.tests.crud.test_crawl_job import create_oldest_job
+
+
+def test_run_next_job_records_crawl_failure(
+    db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    job = create_oldest_job(db)
+    monkeypatch.setattr(
+        crawl_worker, "run_crawler_task", lambda **_: "agoda_failed: boom"
+    )
+
+    assert crawl_worker.run_next_job("worker-1")
+    db.refresh(job)
+    assert job.status == "failed"
+    assert job.error == "agoda_failed: boom"
@@ -0,0 +1,92 @@
+import random
+import string
+
+import pytest
+
+from app.benchmarks.matching import synthetic_dataset
+from app.matching import (
+    ASSIGNMENTS,
+    ENGINES,
+    assign_optimal,
+    match_titles,
+    score_pairs_difflib,
+    score_pairs_indexed,
+)
+
+
+@pytest.mark.parametrize("assignment", ASSIGNMENTS)
+@pytest.mark.parametrize("engine", ENGINES)
+def test_match_titles(engine: str, assignment: str) -> None:
+    booking = ["Hotel Sea Crown", "Pan Pacific Sonargaon Dhaka", "Amari Dhaka"]
+    agoda = ["Pan Pacific Sonargaon", "amari dhaka", "Le Meridien Dhaka", ""]
+    assert match_titles(agoda, booking, engine=engine, assignment=assignment) == [
+        1,
+        2,
+        None,
+        None,
+    ]
+
+
+def test_match_titles_tfidf_scores_cosine_similarity() -> None:
+    booking = ["Hotel Sea Crown", "Sea Crown Resort"]
+    assert match_titles(["hotel sea crown"], booking, 0.99, engine="tfidf") == [0]
+    assert match_titles(["Sea Crown"], booking, 0.99, engine="tfidf") == [None]
+    assert match_titles([], booking, engine="tfidf") == []
+    assert match_titles(["Sea Crown"], [], engine="tfidf") == [None]
+
+
+def test_match_titles_one_to_one() -> None:
+    booking = ["Hotel Sea Crown", "Hotel Sea Crown Cox's Bazar"]
+    agoda = ["Hotel Sea Crown Cox's", "Hotel Sea Crown Coxs Bazar"]
+    assert match_titles(agoda, booking, assignment="greedy") == [1, 1]
+    assert match_titles(agoda, booking, assignment="optimal") == [0, 1]
+
+
+def test_match_titles_rules_out_star_ratings() -> None:
+    booking = ["Hotel Sea Crown", "Hotel Sea Crown", "Hotel Sea Crown"]
+    agoda = ["Hotel Sea Crown", "Hotel Sea Crown", "Hotel Sea Crown"]
+    assert match_titles(
+        agoda,
+        booking,
+        query_stars=[5, 0, 3],
+        candidate_stars=[3, 5, None],
+    ) == [1, 0, 2]
+
+
+def test_assign_optimal() -> None:
+    pairs = [(0, 0, 0.9), (0, 1, 0.85), (1, 0, 0.95), (2, 3, 0.81)]
+    assert assign_optimal(pairs, 4) == [1, 0, 3, None]
+
+
+def test_score_pairs_indexed_same_as_difflib() -> None:
+    rng = random.Random(0)
+    alphabet = string.ascii_lowercase[:4] + " "
+    for _ in range(500):
+        booking = [
+            "".join(rng.choices(alphabet, k=rng.randint(0, 12))) for _ in range(8)
+        ]
+        agoda = ["".join(rng.choices(alphabet, k=rng.randint(0, 12))) for _ in range(4)]
+        for threshold in (0.6, 0.8, 0.9):
+            for best_only in (False, True):
+                assert score_pairs_indexed(
+                    agoda, booking, threshold, best_only=best_only
+                ) == score_pairs_difflib(agoda, booking, threshold, best_only=best_only)
+
+
+@pytest.mark.parametrize("engine", ["difflib", "indexed"])
+def test_match_titles_parallel_same_as_in_process(engine: str) -> None:
+    dataset = synthetic_dataset(120, seed=2)
+    for assignment in ASSIGNMENTS:
+        matches = [
+            match_titles(
+                dataset.agoda,
+                dataset.booking,
+                engine=engine,
+                assignment=assignment,
+                query_stars=dataset.agoda_stars,
+                candidate_stars=dataset.booking_stars,
+                processes=processes,
+            )
+            for processes in (1, 3)
+        ]
+        assert matches[0] == matches[1]
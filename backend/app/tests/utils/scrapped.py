@@ -0,0 +1,59 @@
+import uuid
+
+from sqlmodel import Session
+
+from app.models import CrawlJob, ScrappedItem, ScrappedItemsHistory
+from app.tests.utils.user import create_random_user
+from app.tests.utils.utils import random_lower_string
+
+
+def create_random_history(
+    db: Session, *, city: str = "Dhaka", scrape_status: str = "pending"
+) -> ScrappedItemsHistory:
+    user = create_random_user(db)
+    history = ScrappedItemsHistory(
+        city=city,
+        price_min=1500,
+        price_max=25500,
+        stars=3,
+        scrape_status=scrape_status,
+        owner_id=user.id,
+    )
+    db.add(history)
+    db.commit()
+    db.refresh(history)
+    return history
+
+
+def create_crawled_history(db: Session, *, city: str) -> ScrappedItemsHistory:
+    """
+    A completed history along with the finished crawl job that crawled it.
+    """
+    history = create_random_history(db, city=city, scrape_status="completed")
+    job = CrawlJob(
+        history_id=history.id,
+        city=history.city,
+        price_min=history.price_min,
+        price_max=history.price_max,
+        stars=history.stars,
+        status="completed",
+    )
+    db.add(job)
+    db.commit()
+    return history
+
+
+def create_random_scrapped_item(
+    db: Session, *, history_id: uuid.UUID, price_booking: float = 5000
+) -> ScrappedItem:
+    item = ScrappedItem(
+        title=random_lower_string(),
+        price_booking=price_booking,
+        url_booking=f"https://www.booking.com/hotel/bd/{random_lower_string()}.html",
+        stars=3,
+        history_id=history_id,
+    )
+    db.add(item)
+    db.commit()
+    db.refresh(item)
+    return item
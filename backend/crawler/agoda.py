@@ -0,0 +1,12 @@
+# Shared by the Agoda spider and the app's city ID cache (app/agoda_cities.py),
+# which has to look cities up the way the spider does
+
+# Answers a search text with matching cities, areas and hotels
+SUGGEST_URL = (
+    "https://www.agoda.com/api/cronos/search/GetUnifiedSuggestResult/3/1/1/0/en-us/"
+)
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
+)
@@ -0,0 +1,43 @@
+import re
+
+
+class ResourceBlocker:
+    """
+    PLAYWRIGHT_ABORT_REQUEST predicate that aborts browser requests for the
+    given resource types ("image", "font", "media", ...) and for URLs matching
+    any of the given regular expressions. Blocked requests are counted in the
+    crawl stats under playwright/blocked/.
+    """
+
+    def __init__(self, crawler, resource_types, url_patterns):
+        self.resource_types = frozenset(resource_types)
+        self.url_pattern = (
+            re.compile("|".join(f"(?:{p})" for p in url_patterns))
+            if url_patterns
+            else None
+        )
+        # The crawler's stats collector doesn't exist yet when spiders
+        # install the blocker, it is looked up on use
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            crawler,
+            resource_types=crawler.settings.getlist(
+                "PLAYWRIGHT_BLOCKED_RESOURCE_TYPES"
+            ),
+            url_patterns=crawler.settings.getlist("PLAYWRIGHT_BLOCKED_URL_PATTERNS"),
+        )
+
+    def __call__(self, request):
+        # Never block the document the spider asked for
+        if request.is_navigation_request():
+            return False
+        if request.resource_type in self.resource_types:
+            self.crawler.stats.inc_value(f"playwright/blocked/{request.resource_type}")
+            return True
+        if self.url_pattern is not None and self.url_pattern.search(request.url):
+            self.crawler.stats.inc_value("playwright/blocked/url_pattern")
+            return True
+        return False
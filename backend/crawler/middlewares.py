@@ -4,9 +4,9 @@
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
 from scrapy import signals
-
-# useful for handling different item types with a single interface
-from itemadapter import is_item, ItemAdapter
+from scrapy.core.downloader import Downloader, Slot
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
 
 
 class HotelComparisonSpiderMiddleware:
@@ -101,3 +101,116 @@ class HotelComparisonDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class AdaptiveThrottleMiddleware:
+    """
+    Throttles each site by the limits in the app's CRAWL_THROTTLE setting.
+    Requests to a site share one downloader slot, whose delay follows the
+    observed latency divided by the site's target concurrency, as with
+    AutoThrottle, between min_delay and max_delay. The slot's concurrency
+    grows by one after every round of 2xx and 3xx responses, up to
+    max_concurrency.
+
+    Responses with a BAN_STATUSES status and failed downloads double the
+    delay (or wait out Retry-After) and halve the concurrency. Sites that
+    aren't configured keep Scrapy's defaults.
+    """
+
+    BAN_STATUSES = {403, 408, 429, 503}
+
+    def __init__(self, crawler, limits):
+        self.crawler = crawler
+        self.limits = limits
+        # Responses since the concurrency of each slot last changed
+        self.successes = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        # The limits are app settings, see app.core.config.CrawlThrottle
+        try:
+            from app.core.config import settings
+        except Exception as e:
+            raise NotConfigured(f"App settings unavailable: {e}") from e
+        return cls(crawler, settings.CRAWL_THROTTLE)
+
+    def source(self, request):
+        host = urlparse_cached(request).hostname or ""
+        for domain in self.limits:
+            if host == domain or host.endswith(f".{domain}"):
+                return domain
+        return None
+
+    def slot(self, source):
+        downloader = self.crawler.engine.downloader
+        if source not in downloader.slots:
+            limits = self.limits[source]
+            downloader.slots[source] = Slot(
+                limits.start_concurrency,
+                limits.start_delay,
+                self.crawler.settings.getbool("RANDOMIZE_DOWNLOAD_DELAY"),
+            )
+        return downloader.slots[source]
+
+    def process_request(self, request, spider):
+        source = self.source(request)
+        if source is not None:
+            request.meta.setdefault(Downloader.DOWNLOAD_SLOT, source)
+            self.slot(source)
+        return None
+
+    def process_response(self, request, response, spider):
+        source = self.source(request)
+        if source is None:
+            return response
+        limits = self.limits[source]
+        slot = self.slot(source)
+
+        if response.status in self.BAN_STATUSES:
+            retry_after = response.headers.get(b"Retry-After", b"").decode()
+            self.back_off(
+                source, slot, float(retry_after) if retry_after.isdigit() else 0
+            )
+            return response
+
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            target = latency / limits.target_concurrency
+            delay = (slot.delay + target) / 2
+            # Errors are too quick to lower the delay with
+            if response.status >= 400:
+                delay = max(delay, slot.delay)
+            slot.delay = min(max(delay, limits.min_delay), limits.max_delay)
+
+        # Other errors neither back off nor earn more concurrency
+        if response.status < 400:
+            self.successes[source] = self.successes.get(source, 0) + 1
+            if (
+                self.successes[source] >= slot.concurrency
+                and slot.concurrency < limits.max_concurrency
+            ):
+                slot.concurrency += 1
+                self.successes[source] = 0
+        self.record(source, slot)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        source = self.source(request)
+        if source is not None and not isinstance(exception, IgnoreRequest):
+            self.back_off(source, self.slot(source), 0)
+        return None
+
+    def back_off(self, source, slot, retry_after):
+        limits = self.limits[source]
+        delay = max(slot.delay * 2, limits.start_delay, retry_after)
+        slot.delay = min(delay, max(limits.max_delay, retry_after))
+        slot.concurrency = max(slot.concurrency // 2, 1)
+        self.successes[source] = 0
+        self.crawler.stats.inc_value(f"throttle/{source}/backoffs")
+        self.record(source, slot)
+
+    def record(self, source, slot):
+        stats = self.crawler.stats
+        stats.set_value(f"throttle/{source}/delay", round(slot.delay, 3))
+        stats.set_value(f"throttle/{source}/concurrency", slot.concurrency)
+        stats.max_value(f"throttle/{source}/max_concurrency", slot.concurrency)
@@ -3,11 +3,122 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import uuid
+from datetime import datetime
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from twisted.internet import defer, task, threads
+
+
+def booking_item_row(item, history_id):
+    """
+    Map a booking_spider item to a scrappeditem row.
+    """
+    adapter = ItemAdapter(item)
+    now = datetime.now()
+    return {
+        "id": uuid.uuid4(),
+        "title": adapter.get("title", "Unknown"),
+        "price_booking": float(adapter["price"]) if adapter.get("price") else 0,
+        "url_booking": adapter.get("url", ""),
+        "stars": float(adapter["stars"]) if adapter.get("stars") else None,
+        "image_url": adapter.get("image_url", None),
+        "history_id": history_id,
+        "created_at": now,
+        "updated_at": now,
+    }
 
 
 class HotelComparisonPipeline:
+    """
+    Saves the items of spiders started with a ``history_id`` argument to the
+    scrappeditem table. Items are buffered and written with one multi-row
+    INSERT per batch, whenever HOTEL_PIPELINE_BATCH_SIZE items are waiting or
+    every HOTEL_PIPELINE_FLUSH_INTERVAL seconds. Spiders without a
+    ``history_id`` pass through untouched.
+
+    Items an earlier run saved under the same ``history_id`` (a requeued crawl
+    job) are deleted first. Batches that fail to save are logged and counted
+    under hotel_pipeline/failed_items, the crawl task compares what was saved
+    with what was scraped.
+    """
+
+    def __init__(self, batch_size, flush_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.history_id = None
+        self.buffer = []
+        self.flush_loop = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            batch_size=crawler.settings.getint("HOTEL_PIPELINE_BATCH_SIZE", 50),
+            flush_interval=crawler.settings.getfloat(
+                "HOTEL_PIPELINE_FLUSH_INTERVAL", 1.0
+            ),
+        )
+
+    def open_spider(self, spider):
+        history_id = getattr(spider, "history_id", None)
+        if not history_id:
+            return
+        self.history_id = uuid.UUID(str(history_id))
+        deferred = threads.deferToThread(self._delete_rows, self.history_id)
+        deferred.addCallback(lambda _: self.start_flush_loop(spider))
+        return deferred
+
+    def start_flush_loop(self, spider):
+        self.flush_loop = task.LoopingCall(self.flush, spider)
+        self.flush_loop.start(self.flush_interval, now=False)
+
     def process_item(self, item, spider):
+        if self.history_id is None:
+            return item
+        self.buffer.append(booking_item_row(item, self.history_id))
+        if len(self.buffer) >= self.batch_size:
+            return self.flush(spider).addCallback(lambda _: item)
         return item
+
+    def close_spider(self, spider):
+        if self.flush_loop is not None and self.flush_loop.running:
+            self.flush_loop.stop()
+        return self.flush(spider)
+
+    def flush(self, spider):
+        rows, self.buffer = self.buffer, []
+        if not rows:
+            return defer.succeed(None)
+        # Keep the database round trip off the reactor thread
+        deferred = threads.deferToThread(self._insert_rows, rows)
+        # Errors must not end the flush loop, later batches may still succeed
+        return deferred.addErrback(self.flush_failed, spider, len(rows))
+
+    def flush_failed(self, failure, spider, count):
+        spider.logger.error(f"Error saving {count} items: {failure.value}")
+        spider.crawler.stats.inc_value("hotel_pipeline/failed_items", count)
+
+    @staticmethod
+    def _insert_rows(rows):
+        # The app is only needed when saving, so that spiders can still run
+        # on their own without database settings
+        from sqlalchemy import insert
+
+        from app.core.db import engine
+        from app.models import ScrappedItem
+
+        with engine.begin() as connection:
+            connection.execute(insert(ScrappedItem).values(rows))
+
+    @staticmethod
+    def _delete_rows(history_id):
+        from sqlalchemy import delete
+
+        from app.core.db import engine
+        from app.models import ScrappedItem
+
+        with engine.begin() as connection:
+            connection.execute(
+                delete(ScrappedItem).where(ScrappedItem.history_id == history_id)
+            )
@@ -50,9 +50,11 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#    "crawler.middlewares.HotelComparisonDownloaderMiddleware": 543,
-# }
+DOWNLOADER_MIDDLEWARES = {
+    # Throttles each site by CRAWL_THROTTLE of the app settings. Runs ahead
+    # of RetryMiddleware (550) to see the responses it retries.
+    "crawler.middlewares.AdaptiveThrottleMiddleware": 580,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -62,9 +64,13 @@ ROBOTSTXT_OBEY = True
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-# ITEM_PIPELINES = {
-#    "crawler.pipelines.HotelComparisonPipeline": 300,
-# }
+ITEM_PIPELINES = {
+    "crawler.pipelines.HotelComparisonPipeline": 300,
+}
+# Items of spiders started with a history_id are written to the database in
+# batches of this size, or at least this often (in seconds)
+HOTEL_PIPELINE_BATCH_SIZE = 50
+HOTEL_PIPELINE_FLUSH_INTERVAL = 1.0
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
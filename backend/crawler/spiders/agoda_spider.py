@@ -1,10 +1,94 @@
+import asyncio
 import json
 import os
-from urllib.parse import urlencode
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urljoin
 
 import scrapy
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from scrapy_playwright.page import PageMethod
 
+from crawler.agoda import SUGGEST_URL, USER_AGENT
+from crawler.blocking import ResourceBlocker
+
+# The GraphQL query behind Agoda's search result page, trimmed down to the
+# fields the spider yields
+CITY_SEARCH_QUERY = """
+query citySearch(
+  $CitySearchRequest: CitySearchRequest!,
+  $ContentSummaryRequest: ContentSummaryRequest!,
+  $PricingSummaryRequest: PricingRequestParameters
+) {
+  citySearch(CitySearchRequest: $CitySearchRequest) {
+    searchResult { searchInfo { totalFilteredHotels } }
+    properties(
+      ContentSummaryRequest: $ContentSummaryRequest,
+      PricingSummaryRequest: $PricingSummaryRequest
+    ) {
+      propertyId
+      content {
+        informationSummary {
+          displayName
+          rating
+          propertyLinks { propertyPage }
+        }
+        images { hotelImages { urls { key value } } }
+      }
+      pricing {
+        isAvailable
+        offers {
+          roomOffers {
+            room {
+              pricing {
+                currency
+                price { perRoomPerNight { exclusive { display } } }
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+# Scrolls to the bottom of the page until the number of elements matching
+# selector stops growing for settle ms, or timeout ms have passed
+SCROLL_UNTIL_STABLE = """
+async ({selector, timeout, settle}) => {
+  const start = performance.now();
+  const count = () => document.querySelectorAll(selector).length;
+  let cards = count();
+  let rounds = 0;
+  let grewAt = start;
+  while (performance.now() - start < timeout) {
+    window.scrollTo(0, document.body.scrollHeight);
+    rounds++;
+    await new Promise((resolve) => setTimeout(resolve, 200));
+    const now = count();
+    if (now > cards) {
+      cards = now;
+      grewAt = performance.now();
+    } else if (performance.now() - grewAt >= settle) {
+      break;
+    }
+  }
+  return {cards, rounds, ms: Math.round(performance.now() - start)};
+}
+"""
+
+
+def dig(value, *path):
+    """
+    Follow keys and list indexes into parsed JSON, None if any is missing.
+    """
+    for key in path:
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return value
+
 
 class AgodaSpider(scrapy.Spider):
     name = "agoda_spider"
@@ -12,10 +96,9 @@ class AgodaSpider(scrapy.Spider):
 
     # Add headers to mimic a browser and configure Playwright
     custom_settings = {
-        "USER_AGENT": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36",
+        "USER_AGENT": USER_AGENT,
         "ROBOTSTXT_OBEY": False,
         "COOKIES_ENABLED": True,
-        "DOWNLOAD_DELAY": 2,
         "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
         "DOWNLOAD_HANDLERS": {
             "http": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
@@ -25,11 +108,45 @@ class AgodaSpider(scrapy.Spider):
             "headless": True,
             "timeout": 30 * 1000,
         },
-        "PLAYWRIGHT_BROWSER_CONTEXT_ARGS": {
-            "viewport": {"width": 1920, "height": 1080},
-        },
+        # Price slices of a search are rendered in parallel, in up to
+        # PLAYWRIGHT_MAX_CONTEXTS contexts of PLAYWRIGHT_MAX_PAGES_PER_CONTEXT
+        # pages each
+        "PLAYWRIGHT_MAX_CONTEXTS": 2,
+        "PLAYWRIGHT_MAX_PAGES_PER_CONTEXT": 2,
+        # Only text and image URLs are read from the pages, so skip
+        # downloading what only matters to a human looking at them
+        "PLAYWRIGHT_BLOCKED_RESOURCE_TYPES": ["image", "font", "media"],
+        # Lazily loaded result lists are scrolled until no cards were added
+        # for AGODA_SCROLL_SETTLE_MS, for at most AGODA_SCROLL_TIMEOUT_MS
+        "AGODA_SCROLL_SETTLE_MS": 1000,
+        "AGODA_SCROLL_TIMEOUT_MS": 15000,
+        "PLAYWRIGHT_BLOCKED_URL_PATTERNS": [
+            r"google-analytics\.com",
+            r"googletagmanager\.com",
+            r"doubleclick\.net",
+            r"facebook\.(net|com)/.*(tr|fbevents)",
+            r"hotjar\.com",
+            r"bing\.com/action",
+            r"criteo\.(net|com)",
+            r"agoda\.(com|net)/.*/(rum|beacon|tracking|pixel)",
+        ],
     }
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        if spider.cdp_url:
+            # Connect to a running browser, scrapy-playwright still opens a
+            # context of its own on it and closes it when the crawl ends
+            crawler.settings.set("PLAYWRIGHT_CDP_URL", spider.cdp_url, "spider")
+        if not crawler.settings.get("PLAYWRIGHT_ABORT_REQUEST"):
+            crawler.settings.set(
+                "PLAYWRIGHT_ABORT_REQUEST",
+                ResourceBlocker.from_crawler(crawler),
+                priority="spider",
+            )
+        return spider
+
     def __init__(
         self,
         location="Dhaka",
@@ -42,6 +159,13 @@ class AgodaSpider(scrapy.Spider):
         price_from="10",
         price_to="40",
         cookies_path="cookies_agoda.json",
+        mode="api",
+        api_page_size="45",
+        api_max_pages="5",
+        price_slices="4",
+        cdp_url=None,
+        storage_state=None,
+        city_id=None,
         *args,
         **kwargs,
     ):
@@ -56,12 +180,33 @@ class AgodaSpider(scrapy.Spider):
         self.price_from = int(int(price_from) / 122)
         self.price_to = int(int(price_to) / 122)
         self.cookies_path = cookies_path
-        self.city_id = None
+        # "api" requests the search JSON directly and falls back to the
+        # browser when that fails, "browser" always renders the search page
+        self.mode = mode
+        self.api_page_size = int(api_page_size)
+        self.api_max_pages = int(api_max_pages)
+        # Browser searches are split into this many price ranges
+        self.price_slices = int(price_slices)
+        self.cdp_url = cdp_url
+        # Playwright storage_state file of a session that already visited
+        # the homepage, see app/agoda_sessions.py
+        self.storage_state = storage_state
+        # Agoda's ID of the city, looked up first unless given
+        self.city_id = city_id
         self.results = []
+        # Hotels show up in more than one result page or price slice
+        self.seen_urls = set()
+        # Bodies of the search API responses seen by each search page, read
+        # as they arrive
+        self.search_responses = {}
 
     def start_requests(self):
+        if self.city_id:
+            yield from self.search_requests()
+            return
+
         # First get the city ID
-        city_search_url = f"https://www.agoda.com/api/cronos/search/GetUnifiedSuggestResult/3/1/1/0/en-us/?searchText={self.location}"
+        city_search_url = f"{SUGGEST_URL}?{urlencode({'searchText': self.location})}"
 
         self.logger.info(f"Starting request to: {city_search_url}")
         yield scrapy.Request(
@@ -89,7 +234,218 @@ class AgodaSpider(scrapy.Spider):
 
             self.logger.info(f"Found city ID for {self.location}: {self.city_id}")
 
-            # Now that we have the city ID, construct the search URL
+            yield from self.search_requests()
+        except Exception as e:
+            self.logger.error(f"Error parsing city ID: {e}")
+
+    def search_requests(self):
+        if self.mode == "api":
+            yield self.api_search_request(page_number=1)
+        else:
+            yield from self.browser_search_requests()
+
+    def load_cookies(self):
+        if self.storage_state:
+            with open(self.storage_state) as f:
+                return json.load(f)["cookies"]
+        if not os.path.exists(self.cookies_path):
+            self.logger.warning(f"Cookies file not found at {self.cookies_path}")
+            return []
+        with open(self.cookies_path) as f:
+            return json.load(f)
+
+    def api_search_request(self, page_number):
+        checkin = datetime.strptime(self.checkin, "%Y-%m-%d")
+        checkout = datetime.strptime(self.checkout, "%Y-%m-%d")
+        search_criteria = {
+            "bookingDate": datetime.now(timezone.utc).isoformat(),
+            "checkInDate": f"{self.checkin}T00:00:00.000Z",
+            "localCheckInDate": self.checkin,
+            "los": max((checkout - checkin).days, 1),
+            "rooms": int(self.rooms),
+            "adults": int(self.adults),
+            "children": int(self.children),
+            "childAges": [],
+            "ratePlans": [1],
+            "currency": "USD",
+            "isUserLoggedIn": False,
+            "requiredBasis": "PRPN",
+            "requiredPrice": "Exclusive",
+            "sorting": {"sortField": "Ranking", "sortOrder": "Desc"},
+        }
+        search_context = {
+            "locale": "en-us",
+            "cid": -1,
+            "platform": 1,
+            "deviceTypeId": 1,
+            "storeFrontId": 3,
+            "pageTypeId": 103,
+            "endpointSearchType": "CitySearch",
+        }
+        variables = {
+            "CitySearchRequest": {
+                "cityId": int(self.city_id),
+                "searchRequest": {
+                    "searchCriteria": search_criteria,
+                    "searchContext": search_context,
+                    "filterRequest": {
+                        "idsFilters": [
+                            {
+                                "filterKey": "StarRating",
+                                "ids": [int(self.hotel_star_rating)],
+                            }
+                        ],
+                        "rangeFilters": [
+                            {
+                                "filterKey": "Price",
+                                "ranges": [
+                                    {"from": self.price_from, "to": self.price_to}
+                                ],
+                            }
+                        ],
+                        "textFilters": [],
+                    },
+                    "page": {
+                        "pageSize": self.api_page_size,
+                        "pageNumber": page_number,
+                    },
+                },
+            },
+            "ContentSummaryRequest": {"context": search_context},
+            "PricingSummaryRequest": {
+                "context": search_context,
+                "pricing": search_criteria,
+            },
+        }
+        cookies = self.load_cookies()
+        xsrf_token = next(
+            (c["value"] for c in cookies if c.get("name") == "xsrf_token"), ""
+        )
+        return scrapy.Request(
+            url="https://www.agoda.com/graphql/search",
+            method="POST",
+            body=json.dumps(
+                {
+                    "operationName": "citySearch",
+                    "variables": variables,
+                    "query": CITY_SEARCH_QUERY,
+                }
+            ),
+            headers={
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+                "Origin": "https://www.agoda.com",
+                "Referer": "https://www.agoda.com/search",
+                "ag-language-locale": "en-us",
+                "x-xsrf-token": xsrf_token,
+            },
+            cookies=[
+                {key: c[key] for key in ("name", "value", "domain", "path") if key in c}
+                for c in cookies
+            ],
+            callback=self.parse_api_results,
+            cb_kwargs={"page_number": page_number},
+            meta={"handle_httpstatus_list": [400, 403, 404, 500, 503]},
+            errback=self.fall_back_to_browser,
+            dont_filter=True,
+        )
+
+    def parse_api_results(self, response, page_number):
+        try:
+            data = json.loads(response.text) if response.status == 200 else None
+        except ValueError:
+            data = None
+        properties = dig(data, "data", "citySearch", "properties")
+        if not properties:
+            # An empty first page is as likely a query the API no longer
+            # answers as a city without hotels, let the browser decide
+            self.logger.warning(
+                f"Search API returned no results for page {page_number} "
+                f"(HTTP {response.status})"
+            )
+            self.crawler.stats.inc_value("agoda/api_empty_pages")
+            if page_number == 1:
+                yield from self.browser_search_requests()
+            return
+        self.crawler.stats.inc_value("agoda/api_pages")
+
+        for hotel in properties:
+            result = self.api_result(hotel)
+            if result and result["url"] not in self.seen_urls:
+                self.seen_urls.add(result["url"])
+                self.results.append(result)
+                yield result
+
+        total = dig(
+            data, "data", "citySearch", "searchResult", "searchInfo",
+            "totalFilteredHotels",
+        )  # fmt: skip
+        # Request the remaining pages once, from the first one
+        if page_number == 1 and total:
+            pages = min(-(-total // self.api_page_size), self.api_max_pages)
+            for next_page in range(2, pages + 1):
+                yield self.api_search_request(page_number=next_page)
+
+    def api_result(self, hotel):
+        summary = dig(hotel, "content", "informationSummary") or {}
+        title = summary.get("displayName")
+        link = dig(summary, "propertyLinks", "propertyPage")
+        if not title or not link:
+            return None
+        price = dig(
+            hotel, "pricing", "offers", 0, "roomOffers", 0, "room", "pricing", 0,
+            "price", "perRoomPerNight", "exclusive", "display",
+        )  # fmt: skip
+        if price is None:
+            # Sold out or no offer for these dates, nothing to compare
+            self.crawler.stats.inc_value("agoda/unpriced_properties")
+            return None
+        image_urls = dig(hotel, "content", "images", "hotelImages", 0, "urls") or []
+        image_url = image_urls[-1].get("value") if image_urls else None
+        if image_url and image_url.startswith("//"):
+            image_url = f"https:{image_url}"
+        return {
+            "title": title,
+            "url": urljoin("https://www.agoda.com", link).split("?")[0],
+            "stars": summary.get("rating") or 0,
+            "price": str(price),
+            "image_url": image_url,
+        }
+
+    def fall_back_to_browser(self, failure):
+        self.logger.warning(
+            f"Search API request failed, using the browser: {failure.value}"
+        )
+        if failure.request.cb_kwargs.get("page_number") == 1:
+            yield from self.browser_search_requests()
+
+    def price_ranges(self):
+        """
+        Split the searched price range into up to price_slices ranges of
+        whole dollars. Neighbouring ranges share their bound.
+        """
+        slices = max(min(self.price_slices, self.price_to - self.price_from), 1)
+        bounds = [
+            self.price_from + (self.price_to - self.price_from) * i // slices
+            for i in range(slices + 1)
+        ]
+        return list(zip(bounds, bounds[1:], strict=False))
+
+    def context_kwargs(self):
+        # Start from the warm session, or else with the saved cookies
+        return {
+            "viewport": {"width": 1920, "height": 1080},
+            "storage_state": self.storage_state
+            or {"cookies": self.load_cookies(), "origins": []},
+        }
+
+    def browser_search_requests(self):
+        self.crawler.stats.inc_value("agoda/browser_searches")
+        # Spread the price slices over the contexts, scrapy-playwright keeps
+        # the number of open pages in each one bounded
+        contexts = max(self.settings.getint("PLAYWRIGHT_MAX_CONTEXTS"), 1)
+        urls_by_context = {}
+        for i, (price_from, price_to) in enumerate(self.price_ranges()):
             search_params = {
                 "city": self.city_id,
                 "checkIn": self.checkin,
@@ -98,92 +454,194 @@ class AgodaSpider(scrapy.Spider):
                 "adults": self.adults,
                 "children": self.children,
                 "hotelStarRating": self.hotel_star_rating,
-                "PriceFrom": self.price_from,
-                "PriceTo": self.price_to,
+                "PriceFrom": price_from,
+                "PriceTo": price_to,
             }
-
             search_url = f"https://www.agoda.com/search?{urlencode(search_params)}"
+            urls_by_context.setdefault(f"agoda-{i % contexts}", []).append(search_url)
 
-            # First go to homepage and set cookies
+        for context, urls in urls_by_context.items():
+            if self.storage_state:
+                for url in urls:
+                    yield self.search_page_request(url, context)
+                continue
+
+            # First go to homepage to start a session
             yield scrapy.Request(
                 url="https://www.agoda.com/",
                 callback=self.visit_homepage_with_cookies,
                 meta={
                     "playwright": True,
                     "playwright_include_page": True,
+                    "playwright_context": context,
+                    "playwright_context_kwargs": self.context_kwargs(),
                     "playwright_page_methods": [
                         PageMethod("wait_for_load_state", "domcontentloaded"),
                     ],
-                    "next_url": search_url,
+                    "playwright_page_event_handlers": {
+                        "requestfinished": "record_response_size",
+                    },
+                    "next_urls": urls,
                 },
-                errback=self.handle_error,
+                errback=self.close_page_on_error,
+                dont_filter=True,
             )
-        except Exception as e:
-            self.logger.error(f"Error parsing city ID: {e}")
 
     async def visit_homepage_with_cookies(self, response):
         page = response.meta["playwright_page"]
-        next_url = response.meta["next_url"]
+        context = response.meta["playwright_context"]
 
         try:
-            # Load cookies from file and add them to the context
-            if os.path.exists(self.cookies_path):
-                with open(self.cookies_path) as f:
-                    cookies = json.load(f)
-
-                # Add cookies to the context
-                context = page.context
-                await context.add_cookies(cookies)
-                self.logger.info(f"Added {len(cookies)} cookies to browser context")
-            else:
-                self.logger.warning(f"Cookies file not found at {self.cookies_path}")
-
-            # Small wait after setting cookies
+            # The context started with the saved cookies, give the homepage a
+            # moment to set its own
             await page.wait_for_timeout(1000)
 
             # Close this page
             await page.close()
 
-            # Create a new request with the cookies now set in the browser context
-            yield scrapy.Request(
-                url=next_url,
-                callback=self.parse_search_results,
-                meta={
-                    "playwright": True,
-                    "playwright_include_page": True,
-                    "playwright_page_methods": [
-                        PageMethod("set_default_navigation_timeout", 30000),
-                        # Wait for hotel items to be visible
-                        PageMethod(
-                            "wait_for_selector",
-                            'li[data-selenium="hotel-item"]',
-                            timeout=15000,
-                        ),
-                        # Scroll progressively to load lazy-loaded content
-                        PageMethod("evaluate", "window.scrollTo(0, 500)"),
-                        PageMethod("wait_for_timeout", 1000),
-                        PageMethod("evaluate", "window.scrollTo(0, 1000)"),
-                        PageMethod("wait_for_timeout", 1000),
-                        PageMethod("evaluate", "window.scrollTo(0, 1500)"),
-                        PageMethod("wait_for_timeout", 1000),
-                        PageMethod("evaluate", "window.scrollTo(0, 2000)"),
-                        PageMethod("wait_for_timeout", 1000),
-                    ],
-                    "handle_httpstatus_list": [400, 403, 404, 500, 503],
-                },
-                errback=self.handle_error,
-            )
+            for url in response.meta["next_urls"]:
+                yield self.search_page_request(url, context)
         except Exception as e:
             self.logger.error(f"Error in visit_homepage_with_cookies: {e}")
             if page and not page.is_closed():
                 await page.close()
 
+    def search_page_request(self, url, context):
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_search_results,
+            meta={
+                "playwright": True,
+                "playwright_include_page": True,
+                "playwright_context": context,
+                "playwright_context_kwargs": self.context_kwargs(),
+                "playwright_page_methods": [
+                    PageMethod("set_default_navigation_timeout", 30000),
+                ],
+                # The page fetches its results from the search API, take
+                # them from there instead of scrolling the rendered list
+                "playwright_page_event_handlers": {
+                    "response": "capture_search_response",
+                    "requestfinished": "record_response_size",
+                },
+                "handle_httpstatus_list": [400, 403, 404, 500, 503],
+            },
+            errback=self.close_page_on_error,
+        )
+
+    async def record_response_size(self, request):
+        # Aborted requests never get a response, so their size is unknown.
+        # What blocking saves shows as a drop in this total instead.
+        sizes = await request.sizes()
+        self.crawler.stats.inc_value(
+            "playwright/response_bytes",
+            sizes["responseHeadersSize"] + max(sizes["responseBodySize"], 0),
+        )
+
+    async def scroll_until_stable(self, page, selector):
+        scroll = await page.evaluate(
+            SCROLL_UNTIL_STABLE,
+            {
+                "selector": selector,
+                "timeout": self.settings.getint("AGODA_SCROLL_TIMEOUT_MS"),
+                "settle": self.settings.getint("AGODA_SCROLL_SETTLE_MS"),
+            },
+        )
+        self.record_scroll(scroll["rounds"], scroll["ms"], f"{scroll['cards']} cards")
+
+    async def scroll_for_search_responses(self, page):
+        """
+        Scroll to the bottom of the page until it stops fetching more search
+        results for AGODA_SCROLL_SETTLE_MS, or AGODA_SCROLL_TIMEOUT_MS have
+        passed. The responses are captured by capture_search_response.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        timeout = self.settings.getint("AGODA_SCROLL_TIMEOUT_MS") / 1000
+        settle = self.settings.getint("AGODA_SCROLL_SETTLE_MS") / 1000
+
+        def count():
+            return len(self.search_responses.get(page, []))
+
+        rounds = 0
+        while loop.time() - start < timeout:
+            captured = count()
+            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+            rounds += 1
+            settled_at = loop.time() + settle
+            while count() == captured and loop.time() < settled_at:
+                await asyncio.sleep(0.2)
+            if count() == captured:
+                break
+        ms = round((loop.time() - start) * 1000)
+        self.record_scroll(rounds, ms, f"{count()} search responses")
+
+    def record_scroll(self, rounds, ms, loaded):
+        stats = self.crawler.stats
+        stats.inc_value("agoda/scroll/pages")
+        stats.inc_value("agoda/scroll/rounds", rounds)
+        stats.inc_value("agoda/scroll/ms", ms)
+        stats.max_value("agoda/scroll/max_ms", ms)
+        self.logger.info(f"Scrolled {rounds} times in {ms} ms, {loaded} loaded")
+
+    def is_search_response(self, response):
+        return response.ok and "/graphql/search" in response.url
+
+    def capture_search_response(self, response):
+        if self.is_search_response(response):
+            self.search_responses.setdefault(response.frame.page, []).append(
+                asyncio.ensure_future(response.json())
+            )
+
+    async def captured_properties(self, page):
+        if page not in self.search_responses:
+            try:
+                await page.wait_for_event(
+                    "response", predicate=self.is_search_response, timeout=15000
+                )
+            except PlaywrightTimeoutError:
+                return []
+        # The page fetches later batches of results as its list is scrolled
+        await self.scroll_for_search_responses(page)
+        bodies = await asyncio.gather(
+            *self.search_responses.pop(page, []), return_exceptions=True
+        )
+        properties = []
+        for body in bodies:
+            properties += dig(body, "data", "citySearch", "properties") or []
+        return properties
+
     async def parse_search_results(self, response):
         page = response.meta["playwright_page"]
 
         try:
             self.logger.info(f"Parsing search results from: {response.url}")
 
+            properties = await self.captured_properties(page)
+            if properties:
+                self.crawler.stats.inc_value("agoda/intercepted_pages")
+                self.logger.info(f"Captured {len(properties)} properties")
+                for hotel in properties:
+                    result = self.api_result(hotel)
+                    if result and result["url"] not in self.seen_urls:
+                        self.seen_urls.add(result["url"])
+                        self.results.append(result)
+                        yield result
+                return
+
+            # Fall back to the rendered result list
+            self.crawler.stats.inc_value("agoda/dom_pages")
+            try:
+                await page.wait_for_selector(
+                    'li[data-selenium="hotel-item"]', timeout=15000
+                )
+            except PlaywrightTimeoutError:
+                pass
+            await self.scroll_until_stable(page, 'li[data-selenium="hotel-item"]')
+            response = response.replace(
+                body=(await page.content()).encode("utf-8"), encoding="utf-8"
+            )
+
             # Extract all hotel property cards
             hotel_cards = response.css('li[data-selenium="hotel-item"]')
             self.logger.info(f"Found {len(hotel_cards)} property cards")
@@ -193,9 +651,8 @@ class AgodaSpider(scrapy.Spider):
                     "No hotel cards found! Possible issue with page loading or selectors."
                 )
                 # Save HTML for debugging
-                html_content = await page.content()
                 with open("debug_empty_results.html", "w", encoding="utf-8") as f:
-                    f.write(html_content)
+                    f.write(response.text)
                 self.logger.info(
                     f"Saved debug HTML for review. Current page URL: {page.url}"
                 )
@@ -241,7 +698,10 @@ class AgodaSpider(scrapy.Spider):
                         # Fallback to src attribute
                         image_url = card.css("div.Overlay img::attr(src)").get()
 
+                    if url in self.seen_urls:
+                        continue
                     if title and url:  # Only yield if we have at least title and URL
+                        self.seen_urls.add(url)
                         result = {
                             "title": title,
                             "url": url,
@@ -257,9 +717,19 @@ class AgodaSpider(scrapy.Spider):
         except Exception as e:
             self.logger.error(f"Error in parse_search_results: {e}")
         finally:
+            for body in self.search_responses.pop(page, []):
+                body.cancel()
             if page and not page.is_closed():
                 await page.close()
 
     def handle_error(self, failure):
         self.logger.error(f"Request failed: {failure.value}")
         return None
+
+    async def close_page_on_error(self, failure):
+        # The page is left open when its request fails, and would keep its
+        # slot in the context's page limit
+        self.logger.error(f"Request failed: {failure.value}")
+        page = failure.request.meta.get("playwright_page")
+        if page is not None and not page.is_closed():
+            await page.close()
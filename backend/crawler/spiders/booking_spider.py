@@ -1,3 +1,4 @@
+import re
 from urllib.parse import urljoin
 
 import scrapy
@@ -12,9 +13,11 @@ class BookingSpider(scrapy.Spider):
         "USER_AGENT": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36",
         "ROBOTSTXT_OBEY": False,
         "COOKIES_ENABLED": True,
-        "DOWNLOAD_DELAY": 2,
         "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
     }
+    # Cards per search result page, and the offset booking.com stops at
+    page_size = 25
+    max_offset = 1000
 
     def __init__(
         self,
@@ -26,6 +29,7 @@ class BookingSpider(scrapy.Spider):
         children="0",
         price_range="BDT-5500-19500-1",
         hotel_class="4",
+        history_id=None,
         *args,
         **kwargs,
     ):
@@ -38,7 +42,11 @@ class BookingSpider(scrapy.Spider):
         self.children = children
         self.price_range = price_range
         self.hotel_class = hotel_class
+        # Set when the items should be saved to the database by the pipeline
+        self.history_id = history_id
         self.results = []
+        # Sponsored hotels show up again on later result pages
+        self.seen_urls = set()
 
     def start_requests(self):
         url = "https://www.booking.com/searchresults.html"
@@ -67,25 +75,54 @@ class BookingSpider(scrapy.Spider):
 
         # Convert params to query string manually
         query_string = "&".join(f"{k}={v}" for k, v in params.items())
-        full_url = f"{url}?{query_string}"
+        self.search_url = f"{url}?{query_string}"
 
-        self.logger.info(f"Starting request to: {full_url}")
-        yield scrapy.Request(
-            url=full_url,
+        self.logger.info(f"Starting request to: {self.search_url}")
+        yield self.page_request(offset=0)
+
+    def page_request(self, offset):
+        url = self.search_url
+        if offset:
+            url = f"{url}&offset={offset}"
+        return scrapy.Request(
+            url=url,
             callback=self.parse,
+            cb_kwargs={"offset": offset},
             meta={"dont_redirect": False, "handle_httpstatus_list": [301, 302]},
             errback=self.handle_error,
         )
 
-    def parse(self, response):
+    def parse_total(self, response):
+        # e.g. "Dhaka: 187 properties found"
+        heading = " ".join(response.css("h1 ::text").getall())
+        match = re.search(r"([\d,]+)\s+propert(?:y|ies) found", heading)
+        return int(match.group(1).replace(",", "")) if match else None
+
+    def parse(self, response, offset=0):
         try:
             # Debug the URL actually being crawled
             self.logger.info(f"Parsing URL: {response.url}")
+            self.crawler.stats.inc_value("booking/pages")
 
             # Extract all hotel property cards
             hotel_cards = response.css('div[data-testid="property-card"]')
             self.logger.info(f"Found {len(hotel_cards)} property cards")
 
+            total = self.parse_total(response)
+            if offset == 0 and total:
+                # Request every other result page at once
+                self.logger.info(f"Search has {total} results")
+                last = min(total, self.max_offset)
+                for next_offset in range(self.page_size, last, self.page_size):
+                    yield self.page_request(next_offset)
+            elif (
+                total is None
+                and len(hotel_cards) >= self.page_size
+                and offset + self.page_size < self.max_offset
+            ):
+                # Without a result count, keep going while pages are full
+                yield self.page_request(offset + self.page_size)
+
             for card in hotel_cards:
                 try:
                     # Extract title
@@ -112,7 +149,11 @@ class BookingSpider(scrapy.Spider):
                         else None
                     )
 
+                    if url in self.seen_urls:
+                        self.crawler.stats.inc_value("booking/duplicate_cards")
+                        continue
                     if title and url:  # Only yield if we have at least title and URL
+                        self.seen_urls.add(url)
                         result = {
                             "title": title,
                             "url": url,
@@ -0,0 +1,35 @@
+import pytest
+from scrapy.utils.reactor import install_reactor
+
+# The spiders' TWISTED_REACTOR, it has to be installed before anything
+# imports twisted.internet.reactor
+install_reactor("twisted.internet.asyncioreactor.AsyncioSelectorReactor")
+
+
+@pytest.fixture(scope="module")
+def db():
+    from sqlmodel import Session
+
+    from app.core.db import engine
+
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture()
+def create_spider():
+    def create(spidercls, settings=None, **kwargs):
+        from scrapy.crawler import Crawler
+        from scrapy.settings import Settings
+
+        # Given settings override the spider's custom_settings, as -s does
+        overrides = Settings()
+        overrides.setdict(settings or {}, priority="cmdline")
+        # The steps of Crawler.crawl() up to starting the engine, spiders may
+        # still change the settings in from_crawler
+        crawler = Crawler(spidercls, overrides)
+        crawler.spider = crawler._create_spider(**kwargs)
+        crawler._apply_settings()
+        return crawler.spider
+
+    return create
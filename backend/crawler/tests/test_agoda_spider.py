@@ -0,0 +1,316 @@
+import asyncio
+import json
+from urllib.parse import parse_qsl, urlparse
+
+import pytest
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from scrapy.http import HtmlResponse, Request, TextResponse
+from twisted.python.failure import Failure
+
+from crawler.spiders.agoda_spider import AgodaSpider
+
+
+@pytest.fixture()
+def spider(create_spider):
+    return create_spider(
+        AgodaSpider, city_id="1234", price_from="1220", price_to="12200"
+    )
+
+
+def search_property(name, price=None):
+    hotel = {
+        "content": {
+            "informationSummary": {
+                "displayName": name,
+                "rating": 4,
+                "propertyLinks": {"propertyPage": f"/{name}/hotel/dhaka-bd.html?x=1"},
+            },
+            "images": {
+                "hotelImages": [{"urls": [{"value": f"//pix.agoda.net/{name}.jpg"}]}]
+            },
+        },
+        "pricing": {"offers": []},
+    }
+    if price is not None:
+        room_pricing = {"price": {"perRoomPerNight": {"exclusive": {"display": price}}}}
+        hotel["pricing"]["offers"] = [
+            {"roomOffers": [{"room": {"pricing": [room_pricing]}}]}
+        ]
+    return hotel
+
+
+def search_response(spider, page_number, properties, total):
+    request = spider.api_search_request(page_number=page_number)
+    body = {
+        "data": {
+            "citySearch": {
+                "properties": properties,
+                "searchResult": {"searchInfo": {"totalFilteredHotels": total}},
+            }
+        }
+    }
+    return TextResponse(
+        url=request.url, request=request, body=json.dumps(body), encoding="utf-8"
+    )
+
+
+def test_parse_api_results(spider):
+    response = search_response(
+        spider,
+        1,
+        [
+            search_property("radisson", 95.5),
+            search_property("radisson", 95.5),
+            # No offer for these dates
+            search_property("sold-out"),
+        ],
+        total=100,
+    )
+
+    output = list(spider.parse_api_results(response, page_number=1))
+    items = [o for o in output if isinstance(o, dict)]
+    assert items == [
+        {
+            "title": "radisson",
+            "url": "https://www.agoda.com/radisson/hotel/dhaka-bd.html",
+            "stars": 4,
+            "price": "95.5",
+            "image_url": "https://pix.agoda.net/radisson.jpg",
+        }
+    ]
+    assert spider.crawler.stats.get_value("agoda/unpriced_properties") == 1
+    # The remaining pages are requested from the first one only
+    pages = [o.cb_kwargs["page_number"] for o in output if not isinstance(o, dict)]
+    assert pages == [2, 3]
+    response = search_response(spider, 2, [search_property("radisson", 95.5)], 100)
+    assert list(spider.parse_api_results(response, page_number=2)) == []
+
+
+def test_parse_api_results_falls_back_to_browser(spider):
+    request = spider.api_search_request(page_number=1)
+    response = TextResponse(
+        url=request.url, request=request, status=403, body=b"", encoding="utf-8"
+    )
+
+    output = list(spider.parse_api_results(response, page_number=1))
+    assert output
+    assert all(o.meta.get("playwright") for o in output)
+
+
+def test_parse_api_results_falls_back_to_browser_without_properties(spider):
+    response = search_response(spider, 1, [], total=0)
+
+    output = list(spider.parse_api_results(response, page_number=1))
+    assert output
+    assert all(o.meta.get("playwright") for o in output)
+    assert spider.crawler.stats.get_value("agoda/api_empty_pages") == 1
+    # Later pages coming back empty only end the results
+    response = search_response(spider, 2, [], total=100)
+    assert list(spider.parse_api_results(response, page_number=2)) == []
+
+
+class FakeSearchResponse:
+    ok = True
+    url = "https://www.agoda.com/graphql/search"
+
+    def __init__(self, page, body):
+        self.frame = type("Frame", (), {"page": page})
+        self.body = body
+
+    async def json(self):
+        return self.body
+
+
+class FakeSearchPage:
+    """
+    Answers each scroll with the next batch of search results, the way the
+    result list fetches more of them.
+    """
+
+    def __init__(self, spider, batches):
+        self.spider = spider
+        self.batches = list(batches)
+        self.scrolls = 0
+
+    def respond(self):
+        body = {"data": {"citySearch": {"properties": self.batches.pop(0)}}}
+        self.spider.capture_search_response(FakeSearchResponse(self, body))
+
+    async def evaluate(self, script):
+        self.scrolls += 1
+        if self.batches:
+            asyncio.get_running_loop().call_later(0.1, self.respond)
+
+
+def test_captured_properties_scrolls_for_more_results(create_spider):
+    spider = create_spider(
+        AgodaSpider, settings={"AGODA_SCROLL_SETTLE_MS": 500}, city_id="1234"
+    )
+    batches = [
+        [search_property(f"hotel-{batch}-{n}", 50) for n in range(3)]
+        for batch in range(3)
+    ]
+    page = FakeSearchPage(spider, batches)
+
+    async def capture():
+        # The first batch arrives with the page itself
+        page.respond()
+        return await spider.captured_properties(page)
+
+    properties = asyncio.run(capture())
+    assert len(properties) == 9
+    # Two scrolls load the other batches, the last finds nothing more
+    assert page.scrolls == 3
+    assert spider.crawler.stats.get_value("agoda/scroll/rounds") == 3
+    assert page not in spider.search_responses
+
+
+RENDERED_RESULTS = """
+<ol>
+  <li data-selenium="hotel-item">
+    <a data-selenium="hotel-name" href="/sea-crown/hotel/coxs-bazar-bd.html?cid=1">
+      <span>Sea Crown</span>
+    </a>
+    <div data-testid="rating-container"><svg></svg><svg></svg><svg></svg></div>
+    <div data-element-name="final-price">
+      <span data-selenium="display-price">42</span>
+    </div>
+    <div class="Overlay">
+      <img srcset="//pix.agoda.net/s.jpg 1x, //pix.agoda.net/l.jpg 2x">
+    </div>
+  </li>
+  <li data-selenium="hotel-item">
+    <a data-selenium="hotel-name" href="/long-beach/hotel/coxs-bazar-bd.html">
+      <span>Long Beach</span>
+    </a>
+  </li>
+</ol>
+"""
+
+
+class FakeRenderedPage:
+    """
+    A search page whose results were rendered without a search API response
+    the spider could capture.
+    """
+
+    def __init__(self, html):
+        self.html = html
+        self.scroll_args = None
+        self.closed = False
+
+    async def wait_for_event(self, event, predicate, timeout):
+        raise PlaywrightTimeoutError("Timeout exceeded")
+
+    async def wait_for_selector(self, selector, timeout):
+        pass
+
+    async def evaluate(self, script, arg):
+        self.scroll_args = arg
+        return {"cards": 2, "rounds": 5, "ms": 2100}
+
+    async def content(self):
+        return self.html
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+def test_parse_search_results_scrolls_rendered_list(spider):
+    page = FakeRenderedPage(RENDERED_RESULTS)
+    url = "https://www.agoda.com/search?city=1234"
+    response = HtmlResponse(
+        url=url, body=b"", request=Request(url, meta={"playwright_page": page})
+    )
+
+    async def parse():
+        return [item async for item in spider.parse_search_results(response)]
+
+    items = asyncio.run(parse())
+    assert page.scroll_args == {
+        "selector": 'li[data-selenium="hotel-item"]',
+        "timeout": 15000,
+        "settle": 1000,
+    }
+    assert [item["title"] for item in items] == ["Sea Crown", "Long Beach"]
+    assert items[0]["url"] == "https://www.agoda.com/sea-crown/hotel/coxs-bazar-bd.html"
+    assert items[0]["stars"] == 3
+    assert items[0]["price"] == "42"
+    stats = spider.crawler.stats
+    assert stats.get_value("agoda/dom_pages") == 1
+    assert stats.get_value("agoda/scroll/rounds") == 5
+    assert stats.get_value("agoda/scroll/max_ms") == 2100
+    assert page.closed
+
+
+def test_price_ranges(spider):
+    # 1,220 to 12,200 BDT is searched as 10 to 100 USD
+    assert spider.price_ranges() == [(10, 32), (32, 55), (55, 77), (77, 100)]
+    spider.price_to = 12
+    assert spider.price_ranges() == [(10, 11), (11, 12)]
+
+
+def search_url_prices(url):
+    query = dict(parse_qsl(urlparse(url).query))
+    return int(query["PriceFrom"]), int(query["PriceTo"])
+
+
+def test_browser_search_requests_visit_homepage_per_context(spider, tmp_path):
+    spider.cookies_path = str(tmp_path / "missing.json")
+
+    requests = list(spider.browser_search_requests())
+    assert [r.url for r in requests] == ["https://www.agoda.com/"] * 2
+    assert [r.meta["playwright_context"] for r in requests] == ["agoda-0", "agoda-1"]
+    assert [
+        [search_url_prices(url) for url in r.meta["next_urls"]] for r in requests
+    ] == [[(10, 32), (55, 77)], [(32, 55), (77, 100)]]
+    assert requests[0].meta["playwright_context_kwargs"]["storage_state"] == {
+        "cookies": [],
+        "origins": [],
+    }
+
+
+def test_browser_search_requests_from_warm_session(create_spider, tmp_path):
+    storage_state = tmp_path / "session.json"
+    storage_state.write_text(json.dumps({"cookies": [], "origins": []}))
+    spider = create_spider(
+        AgodaSpider,
+        settings={"PLAYWRIGHT_MAX_CONTEXTS": 3},
+        city_id="1234",
+        price_from="1220",
+        price_to="12200",
+        storage_state=str(storage_state),
+    )
+
+    requests = list(spider.browser_search_requests())
+    assert [search_url_prices(r.url) for r in requests] == [
+        (10, 32),
+        (77, 100),
+        (32, 55),
+        (55, 77),
+    ]
+    assert [r.meta["playwright_context"] for r in requests] == [
+        "agoda-0",
+        "agoda-0",
+        "agoda-1",
+        "agoda-2",
+    ]
+    for request in requests:
+        assert request.callback == spider.parse_search_results
+        assert request.errback == spider.close_page_on_error
+        context_kwargs = request.meta["playwright_context_kwargs"]
+        assert context_kwargs["storage_state"] == str(storage_state)
+
+
+def test_close_page_on_error(spider):
+    page = FakeRenderedPage("")
+    request = spider.search_page_request("https://www.agoda.com/search", "agoda-0")
+    request.meta["playwright_page"] = page
+    failure = Failure(TimeoutError("Navigation timeout"))
+    failure.request = request
+
+    asyncio.run(spider.close_page_on_error(failure))
+    assert page.closed
@@ -0,0 +1,62 @@
+import pytest
+
+from crawler.blocking import ResourceBlocker
+from crawler.spiders.agoda_spider import AgodaSpider
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type, navigation=False):
+        self.url = url
+        self.resource_type = resource_type
+        self.navigation = navigation
+
+    def is_navigation_request(self):
+        return self.navigation
+
+
+@pytest.fixture()
+def blocker(create_spider):
+    spider = create_spider(AgodaSpider, city_id="1234")
+    return spider.settings["PLAYWRIGHT_ABORT_REQUEST"]
+
+
+def test_spider_installs_resource_blocker(blocker):
+    assert isinstance(blocker, ResourceBlocker)
+
+
+@pytest.mark.parametrize(
+    "url, resource_type",
+    [
+        ("https://pix.agoda.net/hotelImages/1.jpg", "image"),
+        ("https://cdn6.agoda.net/fonts/font.woff2", "font"),
+        ("https://www.google-analytics.com/collect?v=2", "xhr"),
+        ("https://www.googletagmanager.com/gtm.js", "script"),
+        ("https://www.agoda.com/api/rum/collect", "fetch"),
+    ],
+)
+def test_resource_blocker_blocks(blocker, url, resource_type):
+    assert blocker(FakeRequest(url, resource_type))
+
+
+@pytest.mark.parametrize(
+    "url, resource_type, navigation",
+    [
+        ("https://www.agoda.com/graphql/search", "fetch", False),
+        ("https://cdn6.agoda.net/js/app.js", "script", False),
+        ("https://www.agoda.com/search?city=1234", "document", True),
+        # The page itself, whatever it looks like
+        ("https://www.agoda.com/doubleclick.net/landing.jpg", "image", True),
+    ],
+)
+def test_resource_blocker_allows(blocker, url, resource_type, navigation):
+    assert not blocker(FakeRequest(url, resource_type, navigation))
+
+
+def test_resource_blocker_counts_blocked_requests(blocker):
+    blocker(FakeRequest("https://pix.agoda.net/1.jpg", "image"))
+    blocker(FakeRequest("https://pix.agoda.net/2.jpg", "image"))
+    blocker(FakeRequest("https://connect.facebook.net/en_US/fbevents.js", "script"))
+
+    stats = blocker.crawler.stats
+    assert stats.get_value("playwright/blocked/image") == 2
+    assert stats.get_value("playwright/blocked/url_pattern") == 1
@@ -0,0 +1,88 @@
+import pytest
+from scrapy.http import HtmlResponse
+
+from crawler.spiders.booking_spider import BookingSpider
+
+
+@pytest.fixture()
+def spider(create_spider):
+    spider = create_spider(BookingSpider, location="Sylhet")
+    # Sets the search URL the result pages are built from
+    list(spider.start_requests())
+    return spider
+
+
+def property_card(n):
+    return f"""
+    <div data-testid="property-card">
+      <a data-testid="title-link" href="/hotel/bd/hotel-{n}.html?aid=304142">
+        <div data-testid="title">Hotel {n}</div>
+      </a>
+      <img data-testid="image" src="https://cf.bstatic.com/{n}.jpg">
+      <span data-testid="price-and-discounted-price">BDT 5,{n:03d}</span>
+    </div>
+    """
+
+
+def result_page(spider, offset, cards, heading=""):
+    request = spider.page_request(offset)
+    body = f"<h1>{heading}</h1>{''.join(property_card(n) for n in cards)}"
+    return HtmlResponse(url=request.url, request=request, body=body, encoding="utf-8")
+
+
+def split_output(output):
+    items = [o for o in output if isinstance(o, dict)]
+    offsets = [o.cb_kwargs["offset"] for o in output if not isinstance(o, dict)]
+    return items, offsets
+
+
+def test_parse_total(spider):
+    response = result_page(spider, 0, [], "Sylhet: 1,187 properties found")
+    assert spider.parse_total(response) == 1187
+    assert spider.parse_total(result_page(spider, 0, [], "Sylhet")) is None
+
+
+def test_first_page_requests_every_page(spider):
+    response = result_page(spider, 0, range(25), "Sylhet: 80 properties found")
+
+    items, offsets = split_output(list(spider.parse(response, offset=0)))
+    assert offsets == [25, 50, 75]
+    assert len(items) == 25
+    assert items[0] == {
+        "title": "Hotel 0",
+        "url": "https://www.booking.com/hotel/bd/hotel-0.html",
+        "stars": 0,
+        "image_url": "https://cf.bstatic.com/0.jpg",
+        "price": "5000",
+    }
+    assert spider.page_request(50).url.endswith("&offset=50")
+
+
+def test_first_page_stops_at_max_offset(spider):
+    response = result_page(spider, 0, range(25), "Sylhet: 4,000 properties found")
+
+    _, offsets = split_output(list(spider.parse(response, offset=0)))
+    assert offsets[-1] == spider.max_offset - spider.page_size
+
+
+def test_later_pages_skip_repeated_hotels(spider):
+    first = result_page(spider, 0, range(25), "Sylhet: 30 properties found")
+    list(spider.parse(first, offset=0))
+    # A sponsored hotel shown again
+    second = result_page(spider, 25, [3, 25, 26], "Sylhet: 30 properties found")
+
+    items, offsets = split_output(list(spider.parse(second, offset=25)))
+    assert offsets == []
+    assert [item["title"] for item in items] == ["Hotel 25", "Hotel 26"]
+    assert spider.crawler.stats.get_value("booking/duplicate_cards") == 1
+    assert spider.crawler.stats.get_value("booking/pages") == 2
+
+
+def test_pages_without_total_continue_while_full(spider):
+    full = result_page(spider, 25, range(25, 50))
+    _, offsets = split_output(list(spider.parse(full, offset=25)))
+    assert offsets == [50]
+
+    partial = result_page(spider, 50, range(50, 60))
+    _, offsets = split_output(list(spider.parse(partial, offset=50)))
+    assert offsets == []
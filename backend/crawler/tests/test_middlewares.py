@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+
+import pytest
+from scrapy import Request, Spider
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+
+from app.core.config import CrawlThrottle
+from crawler.middlewares import AdaptiveThrottleMiddleware
+
+URL = "https://www.booking.com/searchresults.html"
+
+
+@pytest.fixture()
+def middleware():
+    crawler = get_crawler(Spider)
+    # The downloader's slots are all the middleware uses of the engine
+    crawler.engine = SimpleNamespace(downloader=SimpleNamespace(slots={}))
+    limits = CrawlThrottle(
+        start_delay=1,
+        min_delay=0.2,
+        max_delay=10,
+        start_concurrency=2,
+        max_concurrency=4,
+        target_concurrency=2,
+    )
+    return AdaptiveThrottleMiddleware(crawler, {"booking.com": limits})
+
+
+def fetch(middleware, url=URL, status=200, latency=0.4, headers=None):
+    request = Request(url, meta={"download_latency": latency})
+    middleware.process_request(request, None)
+    response = Response(url, status=status, headers=headers, request=request)
+    return middleware.process_response(request, response, None)
+
+
+def booking_slot(middleware):
+    return middleware.crawler.engine.downloader.slots["booking.com"]
+
+
+def test_requests_share_a_slot_per_site(middleware):
+    request = Request("https://secure.booking.com/login.html")
+    middleware.process_request(request, None)
+    assert request.meta["download_slot"] == "booking.com"
+    assert booking_slot(middleware).concurrency == 2
+
+    other = Request("https://example.com/")
+    middleware.process_request(other, None)
+    assert "download_slot" not in other.meta
+
+
+def test_delay_follows_latency(middleware):
+    fetch(middleware, latency=0.4)
+    # Halfway from 1s to the 0.4s latency over a target concurrency of 2
+    assert booking_slot(middleware).delay == pytest.approx(0.6)
+    for _ in range(20):
+        fetch(middleware, latency=0.1)
+    assert booking_slot(middleware).delay == pytest.approx(0.2)
+
+
+def test_concurrency_grows_with_successes(middleware):
+    for _ in range(2):
+        fetch(middleware)
+    assert booking_slot(middleware).concurrency == 3
+    for _ in range(10):
+        fetch(middleware, status=302)
+    assert booking_slot(middleware).concurrency == 4
+    stats = middleware.crawler.stats
+    assert stats.get_value("throttle/booking.com/max_concurrency") == 4
+
+
+def test_errors_do_not_grow_concurrency(middleware):
+    for _ in range(5):
+        fetch(middleware, status=404, latency=0.01)
+        fetch(middleware, status=500, latency=0.01)
+    slot = booking_slot(middleware)
+    assert slot.concurrency == 2
+    # Quick error responses don't lower the delay either
+    assert slot.delay == 1
+
+
+def test_bans_back_off(middleware):
+    for _ in range(5):
+        fetch(middleware)
+    assert booking_slot(middleware).concurrency == 4
+    fetch(middleware, status=429)
+    slot = booking_slot(middleware)
+    assert slot.concurrency == 2
+    assert slot.delay == pytest.approx(1.0)
+
+    fetch(middleware, status=503, headers={"Retry-After": "30"})
+    assert slot.concurrency == 1
+    assert slot.delay == 30
+    stats = middleware.crawler.stats
+    assert stats.get_value("throttle/booking.com/backoffs") == 2
+
+
+def test_failed_downloads_back_off(middleware):
+    request = Request(URL)
+    middleware.process_request(request, None)
+    middleware.process_exception(request, TimeoutError(), None)
+    slot = booking_slot(middleware)
+    assert slot.concurrency == 1
+    assert slot.delay == 2
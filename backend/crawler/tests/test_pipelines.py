@@ -0,0 +1,83 @@
+import pytest
+import scrapy
+from scrapy.utils.test import get_crawler
+from sqlmodel import select
+from twisted.internet import defer
+
+from app.models import ScrappedItem
+from app.tests.utils.scrapped import create_random_history, create_random_scrapped_item
+from crawler import pipelines
+from crawler.pipelines import HotelComparisonPipeline
+
+
+@pytest.fixture(autouse=True)
+def run_in_thread_synchronously(monkeypatch):
+    # There is no running reactor to hand the database results back
+    monkeypatch.setattr(
+        pipelines.threads,
+        "deferToThread",
+        lambda f, *args: defer.maybeDeferred(f, *args),
+    )
+
+
+def booking_spider(history_id):
+    crawler = get_crawler(scrapy.Spider)
+    return scrapy.Spider.from_crawler(crawler, "booking", history_id=history_id)
+
+
+def booking_item(n):
+    return {
+        "title": f"Hotel {n}",
+        "price": "5000",
+        "url": f"https://www.booking.com/hotel/bd/hotel-{n}.html",
+        "stars": "4",
+    }
+
+
+def saved_titles(db, history_id):
+    db.expire_all()
+    statement = select(ScrappedItem.title).where(ScrappedItem.history_id == history_id)
+    return sorted(db.exec(statement).all())
+
+
+def test_pipeline_saves_items_in_batches(db):
+    history = create_random_history(db)
+    # Left by an earlier run of a requeued job
+    create_random_scrapped_item(db, history_id=history.id)
+    spider = booking_spider(history.id)
+    pipeline = HotelComparisonPipeline(batch_size=2, flush_interval=60)
+
+    pipeline.open_spider(spider)
+    assert saved_titles(db, history.id) == []
+    for n in range(3):
+        pipeline.process_item(booking_item(n), spider)
+    assert saved_titles(db, history.id) == ["Hotel 0", "Hotel 1"]
+    pipeline.close_spider(spider)
+    assert saved_titles(db, history.id) == ["Hotel 0", "Hotel 1", "Hotel 2"]
+
+
+def test_pipeline_counts_failed_items(db, monkeypatch):
+    def fail(_rows):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(HotelComparisonPipeline, "_insert_rows", staticmethod(fail))
+    history = create_random_history(db)
+    spider = booking_spider(history.id)
+    pipeline = HotelComparisonPipeline(batch_size=2, flush_interval=60)
+
+    pipeline.open_spider(spider)
+    for n in range(3):
+        pipeline.process_item(booking_item(n), spider)
+    pipeline.close_spider(spider)
+    assert spider.crawler.stats.get_value("hotel_pipeline/failed_items") == 3
+    assert saved_titles(db, history.id) == []
+
+
+def test_pipeline_ignores_spiders_without_history():
+    spider = scrapy.Spider.from_crawler(get_crawler(scrapy.Spider), "agoda")
+    pipeline = HotelComparisonPipeline(batch_size=2, flush_interval=60)
+
+    pipeline.open_spider(spider)
+    item = booking_item(0)
+    assert pipeline.process_item(item, spider) is item
+    pipeline.close_spider(spider)